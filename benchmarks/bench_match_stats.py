@@ -0,0 +1,86 @@
+"""Compares tallying deck stats from fully loaded, unprojected match documents, as the
+stats pipeline did before, with streaming projected matches in batches. Reports
+throughput and the peak Python memory of each path.
+
+    python benchmarks/bench_match_stats.py --matches 200000
+"""
+
+import random
+import time
+import tracemalloc
+
+from common import connect, insert_in_batches, parse_args, scratch_guild
+
+DECKS = [f"Deck {i}" for i in range(60)]
+
+
+def synthetic_matches(count, users):
+    start = time.time() - count*60
+    for i in range(count):
+        players = random.sample(range(users), 4)
+        decks = [random.choice(DECKS) for _ in players]
+        yield {
+            "game_id": f"bench{i}",
+            "status": "ACCEPTED",
+            "season_number": 1,
+            "winner": players[0],
+            "winning_deck": decks[0],
+            "players": [
+                {"user_id": user_id, "name": f"player{user_id}", "deck": deck, "confirmed": True}
+                for user_id, deck in zip(players, decks)
+            ],
+            "timestamp": start + i*60,
+            "replay_link": ""
+        }
+
+
+def tally(matches):
+    decks = {}
+    for match in matches:
+        for player in match["players"]:
+            deck = decks.setdefault(player["deck"], {"entries": 0, "wins": 0})
+            deck["entries"] += 1
+            deck["wins"] += 1 if player["user_id"] == match["winner"] else 0
+    return decks
+
+
+def unprojected(db, guild, batch_size):
+    return tally(list(db.find_matches({"status": "ACCEPTED"}, guild)))
+
+
+def streamed(db, guild, batch_size):
+    return tally(db.find_matches(
+        {"status": "ACCEPTED"}, guild,
+        projection={"_id": 0, "players.deck": 1, "players.user_id": 1, "winner": 1},
+        batch_size=batch_size
+    ))
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    args = parse_args(__doc__, matches=200000, users=2000, batch_size=1000)
+    db = connect(args.mongodb)
+    with scratch_guild(db) as guild:
+        insert_in_batches(db.matches(guild), synthetic_matches(args.matches, args.users))
+        print(f"Deck stats over {args.matches} matches")
+        results = []
+        for name, func in [("unprojected list", unprojected), ("projected stream", streamed)]:
+            runs = [measure(func, db, guild, args.batch_size) for _ in range(args.repeat)]
+            result, elapsed, peak = min(runs, key=lambda run: run[1])
+            results.append(result)
+            print(f"  {name:<16}  {args.matches/elapsed:10.0f} matches/s  peak {peak/2**20:8.1f}MiB")
+        assert results[0] == results[1], "the two paths disagree"
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
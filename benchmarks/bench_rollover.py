@@ -0,0 +1,50 @@
+"""Measures how long RankDB.reset_season takes to end a season in a large league: the
+standings snapshot, the badges and the score reset of every member.
+
+    python benchmarks/bench_rollover.py --members 50000
+"""
+
+import random
+
+from common import connect, insert_in_batches, parse_args, report, scratch_guild, time_ms
+
+
+def synthetic_members(count):
+    for user_id in range(count):
+        accepted = random.randrange(0, 200)
+        wins = random.randint(0, accepted)
+        yield {
+            "name": f"player{user_id}",
+            "user_id": user_id,
+            "points": 1000 + random.randrange(-300, 300),
+            "pending": [],
+            "accepted": accepted,
+            "wins": wins,
+            "losses": accepted - wins,
+            "deck": "",
+            "season_gold_badges": 0,
+            "season_silver_badges": 0,
+            "season_bronze_badges": 0
+        }
+
+
+def main():
+    args = parse_args(__doc__, members=50000)
+    db = connect(args.mongodb)
+    with scratch_guild(db) as guild:
+        insert_in_batches(db.members(guild), synthetic_members(args.members))
+
+        def play_season():
+            # give every member a score to reset, so no update is a no-op
+            db.members(guild).update_many({}, {"$inc": {"points": 7, "accepted": 1, "wins": 1}})
+
+        rows = [("reset_season",) + time_ms(lambda: db.reset_season(guild), args.repeat, setup=play_season)]
+        report(f"Season rollover, {args.members} members", rows)
+        season_number, standings = db.reset_season(guild)
+        assert len(standings) == args.members, "every member should be in the standings"
+        assert db.members(guild).count_documents({"rollover_season": {"$ne": season_number}}) == 0
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Measures how long importing every cog takes in a fresh interpreter, as run.py's
+load_cogs does, with the scientific stack imported lazily (the current code) and
+eagerly (as app.utils.utils and app.cogs.decks used to import it).
+
+    python benchmarks/bench_startup.py --repeat 10
+"""
+
+import argparse
+import importlib.util
+import os
+import statistics
+import subprocess
+import sys
+
+from common import report
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+EAGER_IMPORTS = ["scipy.stats", "statsmodels.stats.proportion"]
+
+LOAD_COGS = """
+import os
+import time
+start = time.perf_counter()
+for module in {modules!r}:
+    __import__(module)
+for cog in sorted(f.split(".")[0] for f in os.listdir("app/cogs") if not f[0] == "_"):
+    __import__("app.cogs." + cog)
+print(1000*(time.perf_counter() - start))
+"""
+
+
+def load_time_ms(modules):
+    output = subprocess.run(
+        [sys.executable, "-c", LOAD_COGS.format(modules=modules)],
+        cwd=SRC_DIR, check=True, stdout=subprocess.PIPE, universal_newlines=True
+    ).stdout
+    return float(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    eager = [module for module in EAGER_IMPORTS if importlib.util.find_spec(module.split(".")[0])]
+    missing = sorted(set(EAGER_IMPORTS) - set(eager))
+    if missing:
+        print(f"Not installed, left out of the eager run: {', '.join(missing)}")
+    rows = []
+    for name, modules in [("lazy (current)", []), ("eager (before)", eager)]:
+        times = [load_time_ms(modules) for _ in range(args.repeat)]
+        rows.append((name, statistics.median(times), min(times)))
+    report(f"Cog import time over {args.repeat} fresh interpreters", rows)
+
+
+if __name__ == "__main__":
+    main()
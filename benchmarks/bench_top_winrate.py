@@ -0,0 +1,62 @@
+"""Compares the winrate leaderboard computed in Python, as find_top_members_by did before,
+with the server-side aggregation it uses now.
+
+    python benchmarks/bench_top_winrate.py --members 100000 --limit 10
+"""
+
+import random
+
+from common import connect, insert_in_batches, parse_args, report, scratch_guild, time_ms
+
+
+def winrates(members):
+    return [member["wins"]/member["accepted"] for member in members]
+
+
+def python_winrate(db, guild, limit, threshold):
+    members = list(db.members(guild).find({"accepted": {"$gte": threshold}}))
+    results = sorted(members, key=(lambda o: o["wins"]/o["accepted"]), reverse=True)
+    return results[:limit] if limit else results
+
+
+def synthetic_members(count):
+    for user_id in range(count):
+        accepted = random.randrange(0, 200)
+        wins = random.randint(0, accepted)
+        yield {
+            "name": f"player{user_id}",
+            "user_id": user_id,
+            "points": 1000 + random.randrange(-300, 300),
+            "pending": [],
+            "accepted": accepted,
+            "wins": wins,
+            "losses": accepted - wins,
+            "deck": "",
+            "season_gold_badges": 0,
+            "season_silver_badges": 0,
+            "season_bronze_badges": 0
+        }
+
+
+def main():
+    args = parse_args(__doc__, members=100000, limit=10, threshold=10)
+    db = connect(args.mongodb)
+    with scratch_guild(db) as guild:
+        insert_in_batches(db.members(guild), synthetic_members(args.members))
+        expected = python_winrate(db, guild, args.limit, args.threshold)
+        found = db.find_top_members_by("winrate", guild, limit=args.limit, threshold=args.threshold)
+        assert winrates(found) == winrates(expected), "the two paths disagree"
+        rows = [
+            ("python sort",) + time_ms(
+                lambda: python_winrate(db, guild, args.limit, args.threshold), args.repeat),
+            ("aggregation",) + time_ms(
+                lambda: db.find_top_members_by("winrate", guild, limit=args.limit, threshold=args.threshold),
+                args.repeat, setup=db._leaderboard_cache.clear)
+        ]
+        report(f"Winrate leaderboard, {args.members} members, limit {args.limit} "
+               f"({len(expected)} returned)", rows)
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Helpers shared by the benchmark scripts. Benchmarks run against the MongoDB server
+at --mongodb (default RANKBOT_TEST_MONGODB or mongodb://localhost:27017) in a scratch
+guild database that is dropped when the benchmark finishes."""
+
+import argparse
+import contextlib
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+
+class FakeGuild(object):
+    def __init__(self, guild_id):
+        self.id = guild_id
+        self.roles = []
+
+
+def parse_args(description, **options):
+    """Returns the parsed command line. options maps extra integer option names to their defaults."""
+
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--mongodb", default=os.environ.get("RANKBOT_TEST_MONGODB", "mongodb://localhost:27017"))
+    parser.add_argument("--repeat", type=int, default=5)
+    for name, default in options.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=default)
+    return parser.parse_args()
+
+
+def connect(uri):
+    from app.utils import database
+
+    db = database.RankDB(uri, serverSelectionTimeoutMS=2000)
+    db.admin.command("ping")
+    return db
+
+
+@contextlib.contextmanager
+def scratch_guild(db):
+    guild = FakeGuild(random.randrange(10**17, 10**18))
+    db.setup_indices(guild)
+    try:
+        yield guild
+    finally:
+        db.drop_database(str(guild.id))
+
+
+def insert_in_batches(collection, documents, batch_size=10000):
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) == batch_size:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+
+
+def time_ms(func, repeat, setup=None):
+    """Calls func repeat times and returns the median and best run time in milliseconds.
+    setup, if given, is called untimed before every run."""
+
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(1000*(time.perf_counter() - start))
+    return statistics.median(times), min(times)
+
+
+def report(title, rows):
+    print(title)
+    width = max(len(name) for name, _, _ in rows)
+    for name, median, best in rows:
+        print(f"  {name:<{width}}  median {median:9.1f}ms  best {best:9.1f}ms")
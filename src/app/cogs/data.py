@@ -4,7 +4,6 @@ import logging
 import re
 from functools import reduce
 
-from app.constants import status_codes as stc
 from app.constants import system
 from app.utils import checks, embed, line_table, table, utils
 
@@ -15,10 +14,10 @@ class Data(commands.Cog):
         self.bot = bot
 
 
-    def _get_game_ids_list(self, matches):
-        if not matches.count():
+    def _get_game_ids_list(self, game_ids):
+        if not game_ids:
             return "N/A"
-        return "\n".join([f"`{match['game_id']}`" for match in matches])
+        return "\n".join([f"`{game_id}`" for game_id in game_ids])
 
 
     @commands.group(
@@ -29,20 +28,15 @@ class Data(commands.Cog):
     async def info(self, ctx):
         """Show summary info of the league. Displays the number of registered players, the number of games recorded, and pending and disputed matches."""
 
-        num_accepted = self.bot.db.count_matches({"status": stc.ACCEPTED}, ctx.message.guild)
-        season_info = self.bot.db.get_season(ctx.message.guild)
-        num_season_accepted = self.bot.db.count_matches({"status": stc.ACCEPTED, "timestamp": {"$gte":season_info['start_time']}}, ctx.message.guild)
-        num_members = self.bot.db.members(ctx.message.guild).count()
-        disputed_matches = self.bot.db.find_matches({"status": stc.DISPUTED}, ctx.message.guild)
-        pending_matches = self.bot.db.find_matches({"status": stc.PENDING}, ctx.message.guild)
-        disputed = self._get_game_ids_list(disputed_matches)
-        pending = self._get_game_ids_list(pending_matches)
+        summary = await self.bot.db.get_league_summary(ctx.message.guild)
+        disputed = self._get_game_ids_list(summary['disputed'])
+        pending = self._get_game_ids_list(summary['pending'])
 
         emsg = embed.info(title=f"{ctx.message.guild.name} League") \
-                    .add_field(name="Players", value=str(num_members)) \
-                    .add_field(name="Current Season", value=str(season_info['season_number'])) \
-                    .add_field(name="Total Games Played", value=str(num_accepted)) \
-                    .add_field(name="Games Played This Season", value=str(num_season_accepted)) \
+                    .add_field(name="Players", value=str(summary['members'])) \
+                    .add_field(name="Current Season", value=str(summary['season_number'])) \
+                    .add_field(name="Total Games Played", value=str(summary['accepted'])) \
+                    .add_field(name="Games Played This Season", value=str(summary['season_accepted'])) \
                     .add_field(name="Pending Games", value=pending) \
                     .add_field(name="Disputed Games", value=disputed) 
 
@@ -63,7 +57,7 @@ class Data(commands.Cog):
 
         if ctx.invoked_subcommand is None:
             limit = utils.DEFAULT_LIMIT
-            players = self.bot.db.find_top_members_by("points", ctx.message.guild, limit=limit)
+            players = await self.bot.db.find_top_members_by("points", ctx.message.guild, limit=limit)
             print(players)
             if not players:
                 await ctx.send(embed=embed.info(description="No players found with enough games played."))
@@ -77,7 +71,7 @@ class Data(commands.Cog):
         if (type(limit) is not int):
             await ctx.send(embed=embed.error(description="Limit should be a number."))
             raise ValueError
-        DEFAULT_THRESHOLD = self.bot.db.get_player_match_threshold(ctx.message.guild)
+        DEFAULT_THRESHOLD = await self.bot.db.get_player_match_threshold(ctx.message.guild)
         min_games = utils.get_command_arg(args, "min", DEFAULT_THRESHOLD)
         if (type(min_games) is not int):
             await ctx.send(embed=embed.error(description="Min should be a number."))
@@ -99,7 +93,7 @@ class Data(commands.Cog):
             limit, min_games = await self.get_top_args(ctx, args)
         except ValueError:
             return
-        players = self.bot.db.find_top_members_by("wins", ctx.message.guild, limit=limit, threshold=min_games)
+        players = await self.bot.db.find_top_members_by("wins", ctx.message.guild, limit=limit, threshold=min_games)
         if not players:
             await ctx.send(embed=embed.info(description="No players found with enough games played."))
             return
@@ -122,7 +116,7 @@ class Data(commands.Cog):
             limit, min_games = await self.get_top_args(ctx, args)
         except ValueError:
             return
-        players = self.bot.db.find_top_members_by("winrate", ctx.message.guild, limit=limit, threshold=min_games)
+        players = await self.bot.db.find_top_members_by("winrate", ctx.message.guild, limit=limit, threshold=min_games)
         if not players:
             await ctx.send(embed=embed.info(description="No players found with enough games played."))
             return
@@ -145,7 +139,7 @@ class Data(commands.Cog):
             limit, min_games = await self.get_top_args(ctx, args)
         except ValueError:
             return
-        players = self.bot.db.find_top_members_by("accepted", ctx.message.guild, limit=limit, threshold=min_games)
+        players = await self.bot.db.find_top_members_by("accepted", ctx.message.guild, limit=limit, threshold=min_games)
         if not players:
             await ctx.send(embed=embed.info(description="No players found with enough games played."))
             return
@@ -169,7 +163,7 @@ class Data(commands.Cog):
             limit, min_games = await self.get_top_args(ctx, args)
         except ValueError:
             return
-        players = self.bot.db.find_top_members_by("points", ctx.message.guild, limit=limit, threshold=min_games)
+        players = await self.bot.db.find_top_members_by("points", ctx.message.guild, limit=limit, threshold=min_games)
         if not players:
             await ctx.send(embed=embed.info(description="No players found with enough games played."))
             return
@@ -292,7 +286,7 @@ class Data(commands.Cog):
         # Display only the selected stat and the sample size
         # Leave detail statistical analysis in the deck info command
         if not ctx.message.mentions:
-            data = utils.get_match_stats(ctx)
+            data = await utils.get_match_stats(ctx)
         else:
             await self.display_player_deck_stats(ctx, sort_key)
             return
@@ -310,9 +304,9 @@ class Data(commands.Cog):
 
         # Check if the sort_key is a deck name
         # If it is a deck name, get deckstats by player for that deck
-        deck = self.bot.db.find_deck(sort_key)
+        deck = await self.bot.db.find_deck(sort_key)
         if deck:
-            data = self.bot.db.find_matches_with_deck(deck["name"], ctx.message.guild, limit=0, season=None)
+            data = await self.bot.db.find_matches_with_deck(deck["name"], ctx.message.guild, limit=0, season=None)
             _tables = self._make_full_deck_player_tables(data, deck["name"])
             if not _tables:
                 await ctx.send(embed=embed.info(description="No matches found with the given deck"))
@@ -342,10 +336,10 @@ class Data(commands.Cog):
     async def display_player_deck_stats(self, ctx, sort_key):
         sort_key = sort_key.split()[0]
         user = ctx.message.mentions[0]
-        if not self.bot.db.find_member(user.id, ctx.message.guild):
+        if not await self.bot.db.is_registered(user.id, ctx.message.guild):
             await ctx.send(embed=embed.error(f"**{user.name}** is not a registered player"))
             return
-        data = utils.get_player_match_stats(ctx, user)
+        data = await utils.get_player_match_stats(ctx, user)
         if not data:
             await ctx.send(embed=embed.error(description=f"No matches found for **{user.name}**"))
             return
@@ -375,7 +369,7 @@ class Data(commands.Cog):
             if winner_type == "deck":
                 deck_name = match['winning_deck'] if match['winning_deck'] else "N/A"
                 if len(deck_name) > max_name_len:
-                    deck_name = self.bot.db.get_deck_short_name(deck_name)
+                    deck_name = self.bot.db.sync.get_deck_short_name(deck_name)
                 winner = deck_name
             else:
                 winner = utils.get_winner_name(match)
@@ -399,7 +393,7 @@ class Data(commands.Cog):
         """Displays a list of filtered games. If no filter type is included, the most recent 10 games will be displayed. If filtered by decks, include a comma-separated list of decks that the games should contain. If filtered by players, mention all players that the games should contain."""
 
         if ctx.invoked_subcommand is None:
-            matches = self.bot.db.find_matches({}, ctx.message.guild, limit=10)
+            matches = await self.bot.db.find_matches({}, ctx.message.guild, limit=10)
             emsgs = self._make_match_table('Recent Games', matches, winner_type="player")
             for emsg in emsgs:
                 await ctx.send(embed=emsg)
@@ -424,7 +418,7 @@ class Data(commands.Cog):
 
         deck_names = []
         for deck_name in deck_name_list:
-            deck = self.bot.db.find_deck(deck_name)
+            deck = await self.bot.db.find_deck(deck_name)
             if not deck:
                 continue
             deck_names.append(deck['name'])
@@ -432,7 +426,7 @@ class Data(commands.Cog):
         if not deck_names:
             await ctx.send(embed=embed.error(ctx, description="No decks found with the given deck names"))
             return
-        matches = self.bot.db.find_matches({"players.deck": {"$all": deck_names}}, ctx.message.guild, limit=20)
+        matches = await self.bot.db.find_matches({"players.deck": {"$all": deck_names}}, ctx.message.guild, limit=20)
         matches = list(matches)
         if not matches:
             await ctx.send(embed=embed.info(description=("No matches found containing " + ", ".join(deck_names))))
@@ -457,7 +451,7 @@ class Data(commands.Cog):
             return
         if len(mentions) == 0:
             mentions.append(ctx.message.author)
-        matches = self.bot.db.find_matches(
+        matches = await self.bot.db.find_matches(
             {"players.user_id": {"$all": [user.id for user in mentions]}},
             ctx.message.guild,
             limit=20
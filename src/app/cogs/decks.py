@@ -1,16 +1,48 @@
+import asyncio
 from datetime import datetime
-from discord.ext import commands
+from discord.ext import commands, tasks
 import json
+import logging
 import re
-import scipy.stats as st
+import time
 from app import exceptions as err
 from app.constants import system
-from app.utils import checks, embed, line_table, scryfall, utils
+from app.utils import checks, embed, line_table, scryfall, stats, utils
 from app.utils.deckhosts import deck_utils
 
 class Decks(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.decklist_max_age = bot._config.get("decklist_max_age", system.decklist_max_age)
+        self._refreshing = set()
+        self._refresh_deck_images.start()
+
+    def cog_unload(self):
+        self._refresh_deck_images.cancel()
+
+    @tasks.loop(seconds=system.deck_image_refresh_interval)
+    async def _refresh_deck_images(self):
+        """Stores commander art on decks that are missing it or whose art is older than deck_image_max_age.
+        Failures are logged per deck, since an exception escaping the task would stop the loop for good."""
+
+        decks = await self.bot.db.find_decks_with_stale_images(system.deck_image_max_age)
+        for deck in decks:
+            if not deck.get("commanders"):
+                continue
+            try:
+                card = await scryfall.search(deck["commanders"][0], use_cache=False)
+                await self.bot.db.set_deck_image_uris(deck["name"], scryfall.get_deck_image_uris(card))
+            except err.CardNotFoundError:
+                logging.error(f"Failed to refresh commander art for {deck['name']}")
+            except asyncio.CancelledError:
+                # a subclass of Exception before Python 3.8, and needed to stop the loop on unload
+                raise
+            except Exception:
+                logging.exception(f"Failed to refresh commander art for {deck['name']}")
+
+    @_refresh_deck_images.before_loop
+    async def _before_refresh_deck_images(self):
+        await self.bot.wait_until_ready()
 
     @commands.command(
         aliases=["set-deck"],
@@ -33,7 +65,7 @@ class Decks(commands.Cog):
         if deck_name.lower() == "rogue":
             official_name = "Rogue"
         else:
-            deck = self.bot.db.find_deck(deck_name)
+            deck = await self.bot.db.find_deck(deck_name)
             if not deck:
                 emsg = embed.error(description=f"{deck_name} is not a recognized deck.") \
                             .add_field(name="Actions", value=action_description)
@@ -41,7 +73,7 @@ class Decks(commands.Cog):
                 return
             else:
                 official_name = deck["name"]
-        self.bot.db.set_deck(official_name, user, ctx.message.guild)
+        await self.bot.db.set_deck(official_name, user, ctx.message.guild)
         await ctx.send(embed=embed.msg(description=f"Deck set to {official_name} for **{user.name}**"))
 
 
@@ -58,10 +90,10 @@ class Decks(commands.Cog):
             emsg = embed.msg(title="Registered Decks")
             colors = utils.get_all_color_combinations()
             for color in colors:
-                example = self.bot.db.find_one_deck_by_color(color)
+                example = await self.bot.db.find_one_deck_by_color(color)
                 if not example:
                     continue
-                decks = self.bot.db.find_decks_by_color(color)
+                decks = await self.bot.db.find_decks_by_color(color)
                 emsg.add_field(name=example["color_name"], value=(
                     "\n".join([deck["name"] for deck in decks])
                 ))
@@ -71,32 +103,53 @@ class Decks(commands.Cog):
             if len(emsg.fields) > 0:
                 await ctx.send(embed=emsg)
         else:
-            example = self.bot.db.find_one_deck_by_color(color)
+            example = await self.bot.db.find_one_deck_by_color(color)
             if not example:
                 await ctx.send(embed=embed.error(description="No decks found with the specified color combination."))
             else:
-                decks = self.bot.db.find_decks_by_color(color)
+                decks = await self.bot.db.find_decks_by_color(color)
                 emsg = embed.msg(
                     title=f"Registered {example['color_name']} Decks",
                     description=("\n".join(deck["name"] for deck in decks))
                 )
                 await ctx.send(embed=emsg)
 
+    async def _refresh_decklist(self, link):
+        """Re-fetches a cached decklist in the background. The caller marks the link as
+        refreshing before scheduling it, so overlapping previews only refresh it once."""
+
+        try:
+            deck = await deck_utils.extract(link)
+            await self.bot.db.save_decklist(link, deck)
+        except (err.DeckNotFoundError, err.CardNotFoundError):
+            logging.error(f"Failed to refresh decklist: {link}")
+        finally:
+            self._refreshing.discard(link)
+
     async def _get_deck(self, ctx, link):
-        """Helper method for deck fetching."""
+        """Helper method for deck fetching. Cached decklists are served immediately
+        and refreshed in the background once they are older than decklist_max_age."""
 
         if not link:
             await ctx.send(embed=embed.error(description="Please include a link to the decklist to preview."))
             return None
 
+        cached = await self.bot.db.find_decklist(link)
+        if cached:
+            if time.time() - cached["fetched_at"] > self.decklist_max_age and link not in self._refreshing:
+                self._refreshing.add(link)
+                self.bot.loop.create_task(self._refresh_decklist(link))
+            return cached["decklist"]
+
         try:
-            deck = deck_utils.extract(link)
+            deck = await deck_utils.extract(link)
         except err.DeckNotFoundError:
             await ctx.send(embed=embed.error(description="Failed to fetch decklist from the given link."))
             return None
         except err.CardNotFoundError:
             await ctx.send(embed=embed.error(description="Failed to fetch commander from Scryfall."))
             return None
+        await self.bot.db.save_decklist(link, deck)
         return deck
         
 
@@ -111,7 +164,7 @@ class Decks(commands.Cog):
             await ctx.send(embed=embed.error(description="No deck name specified."))
             return
 
-        deck = self.bot.db.find_deck(deck_name)
+        deck = await self.bot.db.find_deck(deck_name)
         if not deck:
             await ctx.send(embed=embed.error(
                 description=f"Deck not found. Use `{ctx.prefix}decks` to see a list of decks."))
@@ -148,29 +201,27 @@ class Decks(commands.Cog):
         return line_table.LineTable(rows).text[0]
 
 
-    def _get_match_stats(self, ctx, matches, deck_name):
+    async def _get_match_stats(self, ctx, deck_name):
         match_stats = {}
-        total_appearances = sum(
-            [utils.get_appearances(match, deck_name) for match in matches])
-        total_deck_wins = self.bot.db.count_matches(
-            {"winning_deck": deck_name}, ctx.message.guild)
-        total_matches = self.bot.db.count_matches(
-            {"timestamp": {"$gt":system.deck_tracking_start_date}}, ctx.message.guild)
-        if total_appearances > 1:
-            meta_percent = total_appearances/(total_matches*4)
-            win_percent = total_deck_wins/total_appearances
-            p_value = st.binom_test(total_deck_wins, total_appearances, p=0.25, alternative="greater")
-            confint = utils.confint_95(total_deck_wins, total_appearances)
-            match_stats['meta'] = f"{100*meta_percent:.3g}%"
-            match_stats['winrate'] = f"{100*win_percent:.3g}%, p={p_value:.3g}"
-            match_stats['confint'] = f"{100*confint[0]:.3g}% - {100*confint[1]:.3g}%"
+        deck_stats = await self.bot.db.find_deck_stats(ctx.message.guild)
+        total_entries = sum([record["entries"] for record in deck_stats])
+        record = next((record for record in deck_stats if record["name"] == deck_name), None)
+        deck = {
+            "entries": record["entries"] if record else 0,
+            "wins": record["wins"] if record else 0
+        }
+        if deck["entries"] > 1:
+            stats.compute_deck_stats([deck], total_entries)
+            match_stats['meta'] = f"{100*deck['meta']:.3g}%"
+            match_stats['winrate'] = f"{100*deck['winrate']:.3g}%, p={deck['p_value']:.3g}"
+            match_stats['confint'] = f"{100*deck['confint'][0]:.3g}% - {100*deck['confint'][1]:.3g}%"
         else:
             match_stats['meta'] = "`N/A`"
             match_stats['winrate'] = "`N/A`"
             match_stats['confint'] = "`N/A`"
-        match_stats['wins'] = str(total_deck_wins)
-        match_stats['losses'] = str(total_appearances - total_deck_wins)
-        match_stats['entries'] = str(total_appearances)
+        match_stats['wins'] = str(deck["wins"])
+        match_stats['losses'] = str(deck["entries"] - deck["wins"])
+        match_stats['entries'] = str(deck["entries"])
         return match_stats
 
 
@@ -184,21 +235,28 @@ class Decks(commands.Cog):
         if not deck_name:
             await ctx.send(embed=embed.error(description="No deck name specified"))
             return
-        deck = self.bot.db.find_deck(deck_name)
+        deck = await self.bot.db.find_deck(deck_name)
         if not deck:
             await ctx.send(embed=embed.error(description=f"{deck_name} was not found"))
             return
-        matches = list(self.bot.db.find_matches(
-            {"players.deck": deck['name']}, ctx.message.guild))
-        match_stats = self._get_match_stats(ctx, matches, deck['name'])
+        matches = await self.bot.db.find_matches(
+            {"players.deck": deck['name']}, ctx.message.guild, limit=5,
+            projection={"_id": 0, "game_id": 1, "timestamp": 1, "winning_deck": 1})
+        match_stats = await self._get_match_stats(ctx, deck['name'])
         if matches:
             match_history = self._make_match_history_table(
-                matches[:5], deck['name'])
+                matches, deck['name'])
         else:
             match_history = "`N/A`"
         
-        card = scryfall.search(deck['commanders'][0])
-        image_uris = scryfall.get_image_uris(card)
+        image_uris = deck.get("image_uris")
+        if not image_uris and deck.get("commanders"):
+            try:
+                card = await scryfall.search(deck['commanders'][0])
+                image_uris = scryfall.get_deck_image_uris(card)
+                await self.bot.db.set_deck_image_uris(deck['name'], image_uris)
+            except err.CardNotFoundError:
+                logging.error(f"Failed to find commander art for {deck['name']}")
         emsg = embed.info(title=f"Deck: {deck['name']}") \
                     .add_field(name="Commanders", value=("\n".join(deck['commanders']))) \
                     .add_field(name="Aliases", value=("\n".join(deck['aliases']))) \
@@ -208,8 +266,9 @@ class Decks(commands.Cog):
                     .add_field(name="Losses", value=match_stats['losses']) \
                     .add_field(name="Win %", value=match_stats['winrate']) \
                     .add_field(name="95% Confidence Interval", value=match_stats['confint']) \
-                    .add_field(name="Recent Matches", value=match_history) \
-                    .set_thumbnail(url=image_uris['small'])
+                    .add_field(name="Recent Matches", value=match_history)
+        if image_uris:
+            emsg.set_thumbnail(url=image_uris['small'])
         await ctx.send(embed=emsg)
 
 def setup(bot):
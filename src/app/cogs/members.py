@@ -7,7 +7,6 @@ from app.utils import checks, embed, line_table, table, utils
 class Members(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.favorite_deck_window = 10
 
 
     @commands.command(
@@ -20,7 +19,7 @@ class Members(commands.Cog):
             
         user = ctx.message.author
         guild = ctx.message.guild
-        if self.bot.db.add_member(user, guild):
+        if await self.bot.db.add_member(user, guild):
             emsg = embed.msg(
                 description = "Registered **{}** to the {} league".format(user.name, guild.name)
             )
@@ -31,13 +30,10 @@ class Members(commands.Cog):
         await ctx.send(embed=emsg)
 
 
-    def _get_favorite_deck(self, player, guild):
-        player_id = player["user_id"]
-        matches = self.bot.db.find_user_matches(player_id, guild, limit=self.favorite_deck_window)
+    def _get_favorite_deck(self, player):
         decks = {}
-        for match in matches:
-            player = next((i for i in match["players"] if i["user_id"] == player_id), None)
-            deck_name = player["deck"]
+        # recent_decks is oldest first, so ties go to the most recently played deck
+        for deck_name in (entry["deck"] for entry in reversed(player.get("recent_decks", []))):
             if deck_name and deck_name in decks:
                 decks[deck_name] += 1
             else:
@@ -48,9 +44,9 @@ class Members(commands.Cog):
         return None
 
 
-    def _add_favorite_deck_field(self, emsg, player, guild):
+    def _add_favorite_deck_field(self, emsg, player):
         if "deck" in player and player["deck"]:
-            favorite_deck = self._get_favorite_deck(player, guild)
+            favorite_deck = self._get_favorite_deck(player)
             emsg.add_field(name="Favorite Deck", value=favorite_deck)
 
 
@@ -69,20 +65,7 @@ class Members(commands.Cog):
         if len(badges) > 0:
             emsg.add_field(name="Season Badges", value=badges)
 
-    def _get_profile_card(self, user, guild):
-        player = self.bot.db.find_member(user.id, guild)
-        if not player:
-            return None
-
-        # update username if the username changed
-        if player["name"] != user.name:
-            self.bot.db.members(guild).update_one({
-                "user_id": user.id
-            }, {
-                "$set": {
-                    "name": user.name
-                }
-            })
+    def _get_profile_card(self, user, player):
         win_percent = 100*player["wins"]/player["accepted"] if player["accepted"] else 0.0
         emsg = embed.info(title=user.name) \
                     .set_thumbnail(url=utils.get_avatar(user)) \
@@ -90,7 +73,7 @@ class Members(commands.Cog):
                     .add_field(name="Wins", value=str(player["wins"])) \
                     .add_field(name="Losses", value=str(player["losses"])) \
                     .add_field(name="Win %", value="{:.3f}%".format(win_percent))
-        self._add_favorite_deck_field(emsg, player, guild)
+        self._add_favorite_deck_field(emsg, player)
         self._add_last_played_deck_field(emsg, player)
         self._add_season_badges(emsg, player)
         return emsg
@@ -106,15 +89,23 @@ class Members(commands.Cog):
         """Display the profile of the mentioned player if they are registered. If no player is mentioned, show your own profile."""
 
         users = utils.get_target_users(ctx)
+        guild = ctx.message.guild
+        players = await self.bot.db.find_members({"user_id": {"$in": [user.id for user in users]}}, guild)
+        players = {player["user_id"]: player for player in players}
+
+        # update usernames that changed
+        await self.bot.db.update_member_names({
+            user.id: user.name for user in users
+            if user.id in players and players[user.id]["name"] != user.name
+        }, guild)
         for user in users:
-            profile_card = self._get_profile_card(user, ctx.message.guild)
-            if not profile_card:
+            if user.id not in players:
                 emsg = embed.error(
                     description = "**{}** is not a registered player".format(user.name)
                 )
                 await ctx.send(embed=emsg)
                 continue
-            await ctx.send(embed=profile_card)
+            await ctx.send(embed=self._get_profile_card(user, players[user.id]))
 
 
     @commands.command(
@@ -126,9 +117,7 @@ class Members(commands.Cog):
     async def pending(self, ctx):
         """Display a list of all your pending matches. Use the `remind` command instead to alert players to confirm your pending matches."""
 
-        user = ctx.message.author
-        guild = ctx.message.guild
-        player = self.bot.db.find_member(user.id, guild)
+        player = await utils.get_member(ctx)
         if not player["pending"]:
             emsg = embed.msg(description="You have no pending, unconfirmed matches.")
             await ctx.send(embed=emsg)
@@ -174,9 +163,9 @@ class Members(commands.Cog):
 
         users = utils.get_target_users(ctx)
         for user in users:
-            if not self.bot.db.find_member(user.id, ctx.message.guild):
+            if not await self.bot.db.is_registered(user.id, ctx.message.guild):
                 continue
-            matches = self.bot.db.find_user_matches(user.id, ctx.message.guild, limit=limit)
+            matches = await self.bot.db.find_user_matches(user.id, ctx.message.guild, limit=limit)
             if not matches:
                 await ctx.send(embed=embed.info(description=f"No matches found for **{user.name}**"))
                 continue
@@ -208,22 +197,12 @@ class Members(commands.Cog):
         if len(mentions) > 4:
             await ctx.send(embed=embed.error(description="Too many players mentioned"))
             return
-        matches = self.bot.db.find_matches(
-            {"players.user_id": {"$all": [user.id for user in mentions]}},
-            ctx.message.guild
-        )
-        matches = list(matches)
-        total = len(matches)
+        record = await self.bot.db.find_head_to_head([user.id for user in mentions], ctx.message.guild)
+        total = record["games"]
         if not total:
             await ctx.send(embed=embed.info(description="No matches found containing all mentioned players"))
             return
-        data = {user.name: 0 for user in mentions}
-        for match in matches:
-            winner = next((user.name for user in mentions if user.id == match['winner']), None)
-            if not winner:
-                continue
-            if winner in data:
-                data[winner] += 1
+        data = {user.name: record["wins"].get(str(user.id), 0) for user in mentions}
         players = ", ".join(data.keys())
         emsg = embed.info(title=f"Games Containing: {players}")
         emsg.add_field(name="Total Matches", inline=False, value=str(total))
@@ -5,7 +5,7 @@ import json
 import random
 from app.constants import color_names
 from app import exceptions as err
-from app.utils import embed
+from app.utils import embed, scryfall
 from app.utils.deckhosts import deck_utils
 
 class OwnerCog(commands.Cog):
@@ -99,7 +99,7 @@ class OwnerCog(commands.Cog):
         """Add a user to the database."""
 
         guild = ctx.message.guild
-        if self.bot.db.add_member(user, guild):
+        if await self.bot.db.add_member(user, guild):
             emsg = embed.msg(
                 description = f"Registered **{user.name}** to the {guild.name} league"
             )
@@ -135,12 +135,12 @@ class OwnerCog(commands.Cog):
             return
         winner = users[random.randint(0,3)]
         
-        game_id = self.bot.db.add_match(ctx, winner, users)
+        game_id = await self.bot.db.add_match(ctx, winner, users)
         deck_names = self._load_deck_names("../config/decks.json")
         for user in users:
             rand_deck = self._get_random_deck(deck_names)
-            self.bot.db.confirm_match_for_user(game_id, user.id, rand_deck, guild)
-        delta = self.bot.db.check_match_status(game_id, guild)
+            await self.bot.db.confirm_match_for_user(game_id, user.id, rand_deck, guild)
+        delta = await self.bot.db.check_match_status(game_id, guild)
         if delta:
             await ctx.send(embed=embed.success(description=f'**SUCCESS** - Added {game_id}'))
 
@@ -164,21 +164,23 @@ class OwnerCog(commands.Cog):
         deck_name = args[0]
         deck_link = args[1]
         try:
-            deck = deck_utils.extract(deck_link)
+            deck = await deck_utils.extract(deck_link)
         except err.DeckNotFoundError:
             await ctx.send(embed=embed.error(description=f'**ERROR** - Failed to fetch decklist from link'))
             return
         except err.CardNotFoundError:
             await ctx.send(embed=embed.error(description=f'**ERROR** - Failed to fetch commanders from Scryfall'))
             return
+        await self.bot.db.save_decklist(deck_link, deck)
         color_name = color_names.NAMES[deck["color_identity"]]
-        self.bot.db.add_deck(
+        await self.bot.db.add_deck(
             deck["color_identity"],
             color_name,
             deck_name,
             [deck_name],
             [cmdr['name'] for cmdr in deck["commanders"]],
-            deck_link
+            deck_link,
+            scryfall.get_deck_image_uris(deck["commanders"][0])
         )
         await ctx.send(embed=embed.success(description=f'**SUCCESS** - Imported {deck_name} to deck database'))
 
@@ -197,11 +199,11 @@ class OwnerCog(commands.Cog):
 
         deck_name = args[0]
         aliases = args[1:]
-        deck = self.bot.db.find_deck(deck_name)
+        deck = await self.bot.db.find_deck(deck_name)
         if not deck:
             await ctx.send(embed=embed.error(description='**ERROR** - Deck not found'))
             return
-        response = self.bot.db.add_deck_aliases(deck_name, aliases)
+        response = await self.bot.db.add_deck_aliases(deck_name, aliases)
         if not response:
             await ctx.send(embed=embed.error(description='**ERROR** - No aliases added'))
         else:
@@ -221,13 +223,13 @@ class OwnerCog(commands.Cog):
 
         deck_name = args[0]
         deck_link = args[1]
-        deck = self.bot.db.find_deck(deck_name)
+        deck = await self.bot.db.find_deck(deck_name)
         if not deck:
             await ctx.send(embed=embed.error(description='**ERROR** - Deck not found'))
             return
 
         try:
-            decklist = deck_utils.extract(deck_link)
+            decklist = await deck_utils.extract(deck_link)
         except err.DeckNotFoundError:
             await ctx.send(embed=embed.error(description='**ERROR** - Failed to fetch deck from the given link'))
             return
@@ -235,23 +237,30 @@ class OwnerCog(commands.Cog):
             await ctx.send(embed=embed.error(description='**ERROR** - Failed to fetch commander from Scryfall'))
             return
 
-        self.bot.db.add_deck_link(deck_name, deck_link)
+        await self.bot.db.save_decklist(deck_link, decklist)
+        await self.bot.db.add_deck_link(deck_name, deck_link)
         await ctx.send(embed=embed.success(description=f"**SUCCESS** - Added a link for **{deck['name']}**"))
         
 
-    def _load_decks(self):
+    async def _load_decks(self):
         with open("../config/decks.json", "r") as infile:
             decks = json.load(infile)
         decks_added = 0
         for category in decks:
             for deck in category["decks"]:
-                decks_added += self.bot.db.add_deck(
+                try:
+                    card = await scryfall.search(deck["commanders"][0])
+                    image_uris = scryfall.get_deck_image_uris(card)
+                except err.CardNotFoundError:
+                    image_uris = None
+                decks_added += await self.bot.db.add_deck(
                     category["colors"], 
                     category["color_name"],
                     deck["name"],
                     deck["aliases"],
                     deck["commanders"],
-                    deck["link"]
+                    deck["link"],
+                    image_uris
                 )
         return decks_added
 
@@ -265,14 +274,48 @@ class OwnerCog(commands.Cog):
     async def _rescan_decks(self, ctx):
         """Scans the decks.json file in config/ and imports the decks into the database."""
 
-        decks_added = self._load_decks()
+        decks_added = await self._load_decks()
         if not decks_added:
             await ctx.send(embed=embed.info(
                 description=f"Nothing new to import"))
         else:
             await ctx.send(embed=embed.success(
                 description=f"**SUCCESS** - {decks_added} new deck(s) imported"))
-        
+
+    @commands.command(
+        name="cache-stats", hidden=True,
+        brief="Show cache hit rates",
+        usage="`{0}cache-stats`"
+    )
+    @commands.is_owner()
+    async def _cache_stats(self, ctx):
+        """Shows the hit and miss counts of the bot's caches."""
+
+        cache_stats = await self.bot.db.cache_stats()
+        cache_stats["users"] = self.bot.user_resolver.stats()
+        emsg = embed.info(title="Cache Stats")
+        for name, stats in cache_stats.items():
+            emsg.add_field(name=name, value=(
+                f"hits: {stats['hits']}\n"
+                f"misses: {stats['misses']}\n"
+                f"hit rate: {stats['hit_rate']:.1%}\n"
+                f"size: {stats['size']}"
+            ))
+        await ctx.send(embed=emsg)
+
+    @commands.command(
+        name="rebuild-stats", hidden=True,
+        brief="Rebuild the league's deck and player stats",
+        usage="`{0}rebuild-stats`"
+    )
+    @commands.guild_only()
+    @commands.is_owner()
+    async def _rebuild_stats(self, ctx):
+        """Recomputes the deck stats and each player's deck stats for this league from all accepted matches. Stats are backfilled automatically at startup, so this is only needed to repair them, e.g. after matches were edited directly in the database."""
+
+        decks_found = await self.bot.db.rebuild_stats(ctx.message.guild)
+        await ctx.send(embed=embed.success(
+            description=f"**SUCCESS** - Rebuilt stats for {decks_found} deck(s)"))
 
 
 def setup(bot):
@@ -9,6 +9,15 @@ class Seasons(commands.Cog):
         self.bot = bot
 
 
+    async def _get_season_leaders(self, season_info, guild):
+        user_ids = season_info.get("season_leaders", [])
+        records = await self.bot.db.find_standings(season_info["season_number"], guild, user_ids=user_ids)
+        if not records:
+            # seasons that ended before standings were recorded only have the leaders' ids
+            records = await self.bot.db.find_members({"user_id": {"$in": user_ids}}, guild)
+        names = {record["user_id"]: record["name"] for record in records}
+        return [names[user_id] for user_id in user_ids if user_id in names]
+
     @commands.command(
         brief="Get information about a season",
         usage=("`{0}season`\n" \
@@ -19,7 +28,7 @@ class Seasons(commands.Cog):
     async def season(self, ctx, *, season_number: int = None):
         """Get information about a season."""
 
-        season_info = self.bot.db.get_season(ctx.message.guild, season=season_number)
+        season_info = await self.bot.db.get_season(ctx.message.guild, season=season_number)
         if not season_info:
             await ctx.send(embed=embed.error(description=f"Season {season_number} does not exist."))
             return
@@ -30,12 +39,12 @@ class Seasons(commands.Cog):
         if "end_time" in season_info:
             end_date = datetime.fromtimestamp(season_info["end_time"])
             emsg.add_field(name="End Date", value=end_date.strftime("%Y-%m-%d"))
-            awards = [emojis.first_place, emojis.second_place, emojis.third_place]
-            emsg.add_field(name="Season Awards", value="\n".join(
-                [f"`{awards[i]} - {self.bot.db.find_member(user_id, ctx.message.guild)['name']}`" 
-                for i, user_id in enumerate(season_info["season_leaders"])]
-                )
-            )
+            leaders = await self._get_season_leaders(season_info, ctx.message.guild)
+            if leaders:
+                awards = [emojis.first_place, emojis.second_place, emojis.third_place]
+                emsg.add_field(name="Season Awards", value="\n".join(
+                    [f"`{awards[i]} - {name}`" for i, name in enumerate(leaders)]
+                ))
         await ctx.send(embed=emsg)
 
     @commands.command(
@@ -48,21 +57,24 @@ class Seasons(commands.Cog):
     async def end_season(self, ctx):
         """End the current season and start a new season. Season awards will be given out to the top 3 players."""
 
+        # Rollover to the new season
+        last_season_number, standings = await self.bot.db.reset_season(ctx.message.guild)
+        threshold = await self.bot.db.get_player_match_threshold(ctx.message.guild)
+        standings = [standing for standing in standings if standing['accepted'] >= threshold]
+
         # Display end-of-season stats for the top 10 players for points and games played
-        players = self.bot.db.find_top_members_by("points", ctx.message.guild, limit=10)
-        points_tables = utils.make_leaderboard_table(players, 'points', 'Top Players by Points')
+        points_tables = utils.make_leaderboard_table(standings[:10], 'points', 'Top Players by Points')
         if points_tables is not None:
             for _table in points_tables.text:
                 await ctx.send(_table)
 
-        players = self.bot.db.find_top_members_by("accepted", ctx.message.guild, limit=10)
+        players = sorted(standings, key=lambda standing: standing['accepted'], reverse=True)[:10]
         played_tables = utils.make_leaderboard_table(players, 'accepted', 'Top Players by Games Played')
         if played_tables is not None:
             for _table in played_tables.text:
                 await ctx.send(_table)
 
-        # Rollover to the new season
-        last_season_number, season_leaders = self.bot.db.reset_season(ctx.message.guild)
+        season_leaders = standings[:3]
         awards = [emojis.first_place, emojis.second_place, emojis.third_place]
         emsg = embed.success(description=f"Season {last_season_number} has ended.")
         if season_leaders:
@@ -4,5 +4,33 @@ deck_tracking_start_date = 1529132400
 # minimum matches for a deck or player to show up on the leaderboard
 min_matches = 10
 
+# number of recent matches a player's favorite deck is picked from
+favorite_deck_window = 10
+
 # number of points a player starts with in a season
-base_points = 1000
\ No newline at end of file
+base_points = 1000
+
+# seconds a guild config document is cached before it is re-read
+config_cache_ttl = 300
+
+# seconds the league summary shown by the info command is cached
+summary_cache_ttl = 30
+
+# number of leaderboards cached across guilds, and seconds before a cached leaderboard
+# is re-read even if no match was accepted
+leaderboard_cache_size = 256
+leaderboard_cache_ttl = 10*60
+
+# number of matches fetched per round trip when streaming matches for stats
+match_stats_batch_size = 1000
+
+# number of fetched discord users kept in memory, and how many are fetched at once
+user_cache_size = 1024
+user_fetch_concurrency = 5
+
+# seconds before a cached decklist is refreshed in the background
+decklist_max_age = 24*60*60
+
+# seconds before the commander art stored on a deck is refreshed, and how often to check
+deck_image_max_age = 7*24*60*60
+deck_image_refresh_interval = 60*60
@@ -1,14 +1,39 @@
+import asyncio
 from discord.ext import commands
-import hashids
+import logging
+import time
 
 from app.utils import database
 from app.utils import embed
+from app.utils import users
+from app.utils import web
 
 class RankBot(commands.Bot):
     def setup_config(self, config):
         self._config = config
-        self.db = database.RankDB(config["mongodb_host"], config["mongodb_port"])
-        self.hasher = hashids.Hashids(salt="cEDH league")
+        self.db = database.AsyncRankDB(database.RankDB(config["mongodb_host"], config["mongodb_port"]))
+        self.user_resolver = users.UserResolver(self)
+        self._warmed_up = False
+
+    async def _timed(self, name, *coros):
+        start = time.perf_counter()
+        await asyncio.gather(*coros)
+        logging.info(f"Startup: {name} {1000*(time.perf_counter() - start):.0f}ms")
+
+    async def on_ready(self):
+        # on_ready fires again after every gateway reconnect; the warm-up and migrations only need to run once
+        if self._warmed_up:
+            logging.info("Reconnected, skipping startup warm-up")
+            return
+        self._warmed_up = True
+        await asyncio.gather(
+            self._timed("Deck index", self.db.load_deck_index()),
+            self._timed("Index migration", self.db.ensure_global_indexes(),
+                        *[self.db.ensure_indexes(guild) for guild in self.guilds]),
+            self._timed("Stats backfill", *[self.db.ensure_stats(guild) for guild in self.guilds]),
+            self._timed("Guild configs", *[self.db.get_config(guild) for guild in self.guilds])
+        )
+        logging.info(f"Startup: ready in {len(self.guilds)} guild(s)")
 
     async def on_guild_join(self, guild):
         emsg = embed.msg(description=(
@@ -16,4 +41,9 @@ class RankBot(commands.Bot):
             + "admin using `set_admin [role name]`"
         ))
         await guild.owner.send(embed=emsg)
-        self.db.setup_indices(guild)
+        await self.db.setup_indices(guild)
+
+    async def close(self):
+        await super().close()
+        await web.client.close()
+        self.db.close()
@@ -0,0 +1,80 @@
+import collections
+import threading
+import time
+
+class Cache(object):
+    """Thread-safe key-value cache. Entries expire ttl seconds after they are set
+    (never, if ttl is None), and the least recently used entry is evicted once more
+    than maxsize entries are stored. Hits and misses are counted so the saved
+    lookups can be reported.
+
+    A value read from the database while another thread invalidates the cache may
+    already be stale when it is set. Callers can take the cache's generation before
+    reading and pass it to set, which then drops the value if anything was
+    invalidated in between."""
+
+    def __init__(self, ttl=None, maxsize=None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._generation = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def generation(self):
+        """Returns a counter that increases whenever entries are invalidated."""
+
+        with self._lock:
+            return self._generation
+
+    def set(self, key, value, generation=None):
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            if self.maxsize is not None and len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        """Removes every entry whose key satisfies predicate."""
+
+        with self._lock:
+            self._generation += 1
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits/lookups if lookups else 0.0
+            }
@@ -2,7 +2,7 @@ import discord
 from app.utils import embed
 
 async def is_registered(ctx):
-    if not ctx.bot.db.find_member(ctx.message.author.id, ctx.message.guild):
+    if not await ctx.bot.db.is_registered(ctx.message.author.id, ctx.message.guild):
         await ctx.send(embed=embed.error(description=f"**{ctx.message.author.name}** is not registered"))
         return False
     return True
@@ -12,7 +12,7 @@ async def is_admin(ctx):
         return True
     if ctx.message.author.id == ctx.message.guild.owner.id:
         return True
-    admin_role = ctx.bot.db.get_admin_role(ctx.message.guild)
+    admin_role = await ctx.bot.db.get_admin_role(ctx.message.guild)
     if not discord.utils.find(lambda r: r.name == admin_role.name, ctx.message.author.roles):
         return False
     return True
@@ -1,17 +1,28 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import itertools
+import logging
+import threading
 import time
 
 import discord
-from pymongo import MongoClient, DESCENDING
+import hashids
+from pymongo import MongoClient, ASCENDING, DESCENDING, DeleteOne, IndexModel, ReplaceOne, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from pymongo.command_cursor import CommandCursor
+from pymongo.cursor import Cursor
 from app.constants import status_codes as stc
 from app.constants import system
-from app.utils import utils
+from app.utils import cache, utils
 
 """PRECOND: All messages that are to be processed are received in a server rather than DM
 
 Config: {
     admin: str,
     player_match_threshold: int,
-    deck_match_threshold: int
+    deck_match_threshold: int,
+    stats_version: int
 }
 
 Seasons: {
@@ -20,7 +31,19 @@ Seasons: {
     season_number: int,
     season_leaders: [
         {user_id: int}
-    ]
+    ],
+    standings_recorded: bool
+}
+
+Standing: {
+    season_number: int,
+    rank: int,
+    user_id: int,
+    name: str,
+    points: int,
+    wins: int,
+    losses: int,
+    accepted: int
 }
 
 Member: {
@@ -34,7 +57,24 @@ Member: {
     deck: str,
     season_gold_badges: int,
     season_silver_badges: int,
-    season_bronze_badges: int
+    season_bronze_badges: int,
+    rollover_season: int,
+    recent_decks: [
+        {game_id: str, deck: str}
+    ],
+    deck_stats: {
+        deck_field: {
+            name: str,
+            entries: int,
+            wins: int,
+            seasons: {
+                season_number: {
+                    entries: int,
+                    wins: int
+                }
+            }
+        }
+    }
 }
 
 Match: {
@@ -43,6 +83,7 @@ Match: {
     winning_deck: str,
     status: str,
     timestamp: float,
+    season_number: int,
     players: [
         player: {
             name: str,
@@ -59,11 +100,198 @@ Deck: {
     canonical_aliases: [str],
     description: str,
     color: str,
-    color_name: str
+    color_name: str,
+    image_uris: {
+        small: str,
+        art_crop: str
+    },
+    image_uris_updated: float
+}
+
+Decklist: {
+    link: str,
+    fetched_at: float,
+    decklist: {
+        commanders: [dict],
+        decklist: [dict],
+        color_identity: str
+    }
+}
+
+DeckStats: {
+    name: str,
+    entries: int,
+    wins: int,
+    players: [int],
+    seasons: {
+        season_number: {
+            entries: int,
+            wins: int
+        }
+    }
+}
+
+HeadToHead: {
+    _id: str,
+    players: [int],
+    games: int,
+    wins: {
+        user_id: int
+    }
 }
 """
 
+# Indexes for the query shapes used below, by guild collection
+INDEXES = {
+    "members": [
+        IndexModel([("user_id", ASCENDING)]),
+        IndexModel([("accepted", DESCENDING), ("wins", DESCENDING)]),
+        IndexModel([("pending", ASCENDING)])
+    ],
+    "matches": [
+        IndexModel([("game_id", ASCENDING)], unique=True),
+        IndexModel([("timestamp", DESCENDING)]),
+        IndexModel([("status", ASCENDING), ("timestamp", DESCENDING)]),
+        IndexModel([("season_number", ASCENDING), ("status", ASCENDING)]),
+        IndexModel([("players.user_id", ASCENDING), ("timestamp", DESCENDING)]),
+        IndexModel([("players.deck", ASCENDING), ("timestamp", DESCENDING)]),
+        IndexModel([("winning_deck", ASCENDING)])
+    ],
+    "seasons": [
+        IndexModel([("start_time", DESCENDING)]),
+        IndexModel([("season_number", ASCENDING)])
+    ],
+    "deck_stats": [
+        IndexModel([("name", ASCENDING)], unique=True)
+    ],
+    "head_to_head": [
+        IndexModel([("players", ASCENDING)])
+    ],
+    "standings": [
+        IndexModel([("season_number", ASCENDING), ("rank", ASCENDING)], unique=True)
+    ]
+}
+
+# Indexes for the collections shared by every guild, in the decks database
+GLOBAL_INDEXES = {
+    "decks": [
+        IndexModel([("name", ASCENDING)]),
+        IndexModel([("canonical_aliases", ASCENDING)]),
+        IndexModel([("color", ASCENDING)]),
+        IndexModel([("image_uris_updated", ASCENDING)])
+    ],
+    "decklists": [
+        IndexModel([("link", ASCENDING)], unique=True)
+    ]
+}
+
+# Fields set on every member when a season's scores are reset
+RESET_SCORES = {
+    "points": system.base_points,
+    "wins": 0,
+    "accepted": 0,
+    "losses": 0
+}
+
+# Version of the stats derived from accepted matches (deck_stats, head_to_head and the
+# members' deck_stats and recent_decks). Leagues whose config records an older version
+# are rebuilt by ensure_stats, so bump it whenever their shape changes.
+STATS_VERSION = 2
+
+# Indexes superseded by the catalog above, by guild collection
+OBSOLETE_INDEXES = {
+    "matches": ["status_1"]
+}
+
+def deck_field(deck_name):
+    """Returns the key of a deck in a member's deck_stats. Field names can't contain '.'
+    or start with '$', so those are swapped for their full-width forms."""
+
+    if not deck_name:
+        return "_"
+    return deck_name.replace(".", "\uff0e").replace("$", "\uff04")
+
+def _has_duplicates(collection, keys):
+    """Returns True if more than one document in the collection has the same values for keys."""
+
+    duplicates = collection.aggregate([
+        {"$group": {
+            "_id": {f"k{i}": f"${field}" for i, (field, _) in enumerate(keys)},
+            "count": {"$sum": 1}
+        }},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": 1}
+    ], allowDiskUse=True)
+    return next(duplicates, None) is not None
+
+def pod_key(user_ids):
+    """Returns the head_to_head _id of a group of players, independent of their order."""
+
+    return "-".join(str(user_id) for user_id in sorted(user_ids))
+
+def _head_to_head_updates(match):
+    """Returns an upsert for every group of 2 or more players in the match's pod."""
+
+    user_ids = [player["user_id"] for player in match["players"]]
+    updates = []
+    for size in range(2, len(user_ids) + 1):
+        for group in itertools.combinations(user_ids, size):
+            inc = {"games": 1}
+            if match["winner"] in group:
+                inc[f"wins.{match['winner']}"] = 1
+            updates.append(UpdateOne(
+                {"_id": pod_key(group)},
+                {"$inc": inc, "$setOnInsert": {"players": sorted(group)}},
+                upsert=True
+            ))
+    return updates
+
 class RankDB(MongoClient):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._transactions_supported = None
+        self._deck_index = None
+        self._deck_index_lock = threading.Lock()
+        self._stats_locks = {}
+        self._stats_locks_lock = threading.Lock()
+        self._config_cache = cache.Cache(ttl=system.config_cache_ttl)
+        self._summary_cache = cache.Cache(ttl=system.summary_cache_ttl)
+        self._season_cache = cache.Cache()
+        self._leaderboard_cache = cache.Cache(
+            ttl=system.leaderboard_cache_ttl, maxsize=system.leaderboard_cache_size)
+        self._registered = {}
+        self._unique_game_ids = {}
+        self._game_id_hasher = hashids.Hashids(
+            salt="cEDH league", min_length=4, alphabet="abcdefghijklmnopqrstuvwxyz0123456789")
+
+    def _supports_transactions(self):
+        """Transactions require a replica set or a sharded cluster."""
+
+        if self._transactions_supported is None:
+            ismaster = self.admin.command("ismaster")
+            self._transactions_supported = "setName" in ismaster or ismaster.get("msg") == "isdbgrid"
+        return self._transactions_supported
+
+    def _run_in_transaction(self, callback):
+        """Calls callback with a session in an open transaction and returns its result.
+        The transaction is retried on transient errors, e.g. a write conflict between two
+        commands racing on the same document, so callbacks must be safe to rerun. If the
+        deployment does not support transactions, callback is called with None and its
+        writes are applied one at a time."""
+
+        if not self._supports_transactions():
+            return callback(None)
+        with self.start_session() as session:
+            return session.with_transaction(callback)
+
+    def cache_stats(self):
+        return {
+            "config": self._config_cache.stats(),
+            "summary": self._summary_cache.stats(),
+            "season": self._season_cache.stats(),
+            "leaderboard": self._leaderboard_cache.stats()
+        }
+
     def guild(self, guild):
         return self[str(guild.id)]
 
@@ -83,17 +311,87 @@ class RankDB(MongoClient):
         db = self.guild(guild)
         return db.seasons
 
+    def deck_stats(self, guild):
+        db = self.guild(guild)
+        return db.deck_stats
+
+    def head_to_head(self, guild):
+        db = self.guild(guild)
+        return db.head_to_head
+
+    def standings(self, guild):
+        db = self.guild(guild)
+        return db.standings
+
+    def counters(self, guild):
+        db = self.guild(guild)
+        return db.counters
+
     def decks(self):
         return self["decks"].decks
 
+    def decklists(self):
+        return self["decks"].decklists
+
+    def ensure_indexes(self, guild):
+        """Brings the guild's indexes in line with INDEXES. Safe to run repeatedly.
+        Indexes whose options changed (e.g. game_id becoming unique) are rebuilt,
+        and superseded indexes are dropped."""
+
+        db = self.guild(guild)
+        for collection_name, indexes in INDEXES.items():
+            self._ensure_collection_indexes(db[collection_name], indexes)
+        self._unique_game_ids.pop(guild.id, None)
+
+    def ensure_global_indexes(self, db_name="decks"):
+        """Brings the indexes of the collections shared by every guild in line with GLOBAL_INDEXES.
+        db_name only needs changing to index a scratch copy, e.g. in tests."""
+
+        db = self[db_name]
+        for collection_name, indexes in GLOBAL_INDEXES.items():
+            self._ensure_collection_indexes(db[collection_name], indexes)
+
+    def _ensure_collection_indexes(self, collection, indexes):
+        existing = collection.index_information()
+        to_create = []
+        for index in indexes:
+            document = index.document
+            name = document["name"]
+            keys = list(document["key"].items())
+            unique = document.get("unique", False)
+            if unique and not existing.get(name, {}).get("unique", False) and _has_duplicates(collection, keys):
+                # A unique build would fail, so keep the index without the constraint
+                logging.error(f"Duplicate {name} values in {collection.full_name}, indexing without a unique constraint")
+                index = IndexModel(keys, name=name)
+                unique = False
+            if name in existing and existing[name].get("unique", False) != unique:
+                collection.drop_index(name)
+            to_create.append(index)
+        try:
+            collection.create_indexes(to_create)
+        except OperationFailure as e:
+            logging.error(f"Failed to create indexes on {collection.full_name}: {e}")
+            # Duplicates written since the check can still fail a unique build, so make
+            # sure every index exists, even if it can't enforce uniqueness
+            existing = collection.index_information()
+            for index in to_create:
+                name = index.document["name"]
+                if name not in existing:
+                    try:
+                        collection.create_index(list(index.document["key"].items()), name=name)
+                    except OperationFailure as e:
+                        logging.error(f"Failed to create index {name} on {collection.full_name}: {e}")
+        for name in OBSOLETE_INDEXES.get(collection.name, []):
+            if name in existing:
+                collection.drop_index(name)
+
     def setup_indices(self, guild):
-        self.members(guild).create_index("user_id")
-        self.matches(guild).create_index("game_id")
-        self.matches(guild).create_index("status")
+        self.ensure_indexes(guild)
         self.config(guild).insert_one({
             "admin": "",
             "player_match_threshold": 10,
-            "deck_match_threshold": 10
+            "deck_match_threshold": 10,
+            "stats_version": STATS_VERSION
         })
         self.seasons(guild).insert_one({
             "start_time": time.time(),
@@ -102,8 +400,20 @@ class RankDB(MongoClient):
 
 
     # Member methods
+    def _registered_members(self, guild):
+        """Returns the set of registered user ids for the guild, loading it on first use."""
+
+        registered = self._registered.get(guild.id)
+        if registered is None:
+            registered = set(self.members(guild).distinct("user_id"))
+            self._registered[guild.id] = registered
+        return registered
+
+    def is_registered(self, user_id, guild):
+        return int(user_id) in self._registered_members(guild)
+
     def add_member(self, user, guild):
-        if not self.find_member(user.id, guild):
+        if not self.is_registered(user.id, guild):
             document = {
                 "name": user.name,  # string
                 "user_id": user.id, # int (was string)
@@ -117,11 +427,19 @@ class RankDB(MongoClient):
                 "season_silver_badges": 0,
                 "season_bronze_badges": 0
             }
-            return self.members(guild).insert_one(document)
+            result = self.members(guild).insert_one(document)
+            self._registered_members(guild).add(user.id)
+            self._summary_cache.invalidate(guild.id)
+            self._invalidate_leaderboards(guild)
+            return result
         return False
 
     def delete_member(self, user_id, guild):
-        return self.members(guild).find_one_and_delete({"user_id": user_id})
+        member = self.members(guild).find_one_and_delete({"user_id": user_id})
+        self._registered_members(guild).discard(user_id)
+        self._summary_cache.invalidate(guild.id)
+        self._invalidate_leaderboards(guild)
+        return member
 
     def find_member(self, user_id, guild):
         return self.members(guild).find_one({"user_id": int(user_id)})
@@ -129,24 +447,54 @@ class RankDB(MongoClient):
     def find_members(self, query, guild, limit=0):
         return self.members(guild).find(query, limit=limit)
 
+    def count_members(self, guild):
+        return self.members(guild).estimated_document_count()
+
+    def update_member_names(self, names, guild):
+        """Sets the names of several members at once, names being a dict of user_id to name."""
+
+        if not names:
+            return None
+        result = self.members(guild).bulk_write([
+            UpdateOne({"user_id": user_id}, {"$set": {"name": name}})
+            for user_id, name in names.items()
+        ], ordered=False)
+        self._invalidate_leaderboards(guild)
+        return result
+
+    def _invalidate_leaderboards(self, guild):
+        self._leaderboard_cache.invalidate_where(lambda key: key[0] == guild.id)
+
     def find_top_members_by(self, sort_key, guild, limit=0, threshold=None):
+        """Returns the members with at least threshold accepted matches, sorted by sort_key.
+        Leaderboards are cached until a match is accepted, a member joins or leaves, the
+        scores are reset or the threshold changes. A read that races with one of those is
+        not cached."""
+
         if not threshold:
             threshold = self.get_player_match_threshold(guild)
+        key = (guild.id, sort_key, threshold, limit)
+        members = self._leaderboard_cache.get(key)
+        if members is not None:
+            return list(members)
+        generation = self._leaderboard_cache.generation()
         if sort_key == "winrate":
-            members = self.members(guild).find(
-                {"accepted": {"$gte": threshold}})
-            members = [member for member in members]
-            results = sorted(members, key=(lambda o: o['wins']/o['accepted']), reverse=True)
-            if not limit:
-                return results
-            return results[:limit]
+            pipeline = [
+                {"$match": {"accepted": {"$gte": threshold, "$gt": 0}}},
+                {"$addFields": {"winrate": {"$divide": ["$wins", "$accepted"]}}},
+                {"$sort": {"winrate": DESCENDING}}
+            ]
+            if limit:
+                pipeline.append({"$limit": limit})
+            members = self.members(guild).aggregate(pipeline)
         else:
             members = self.members(guild).find(
                 {"accepted": {"$gte": threshold}}, 
                 limit=limit, sort=[(sort_key, DESCENDING)]
             )
-            members = [member for member in members]
-            return members
+        members = [member for member in members]
+        self._leaderboard_cache.set(key, members, generation)
+        return list(members)
 
     def push_pending_match(self, game_id, user_ids, guild):
         self.members(guild).update_many(
@@ -165,33 +513,65 @@ class RankDB(MongoClient):
         )
 
     # Match methods
-    def get_game_id(self, hasher, msg_id, guild):
-        while(True):
-            game_id = hasher.encode(msg_id)[:4].lower()
-            if not self.find_match(game_id, guild):
-                return game_id
-            msg_id -= 1
+    def get_game_id(self, guild):
+        """Allocates a game id from an atomic per-guild counter. Distinct counter values
+        encode to distinct ids, so concurrent matches never share an id."""
+
+        counter = self.counters(guild).find_one_and_update(
+            {"_id": "game_id"},
+            {"$inc": {"seq": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return self._game_id_hasher.encode(counter["seq"])
+
+    def _game_ids_unique(self, guild):
+        """Returns True if the guild's game_id index enforces uniqueness. It doesn't when
+        legacy matches share an id, see _ensure_collection_indexes."""
+
+        unique = self._unique_game_ids.get(guild.id)
+        if unique is None:
+            unique = any(
+                index.get("unique", False) and [field for field, _ in index["key"]] == ["game_id"]
+                for index in self.matches(guild).index_information().values()
+            )
+            self._unique_game_ids[guild.id] = unique
+        return unique
 
     def add_match(self, ctx, winner, users):
-        game_id = self.get_game_id(ctx.bot.hasher, ctx.message.id, ctx.message.guild)
-        pending_record = {
-            "game_id": game_id,
-            "status": stc.PENDING,
-            "winner": winner.id,
-            "winning_deck": "",
-            "players": [
-                {
-                    "user_id": user.id,
-                    "name": user.name,
-                    "deck": "",
-                    "confirmed": False
-                } for user in users
-            ],
-            "timestamp": time.time(),
-            "replay_link": ""
-        }
-        self.matches(ctx.message.guild).insert_one(pending_record)
-        self.push_pending_match(game_id, [user.id for user in users], ctx.message.guild)
+        guild = ctx.message.guild
+        season_number = self.get_season(guild)["season_number"]
+        while(True):
+            game_id = self.get_game_id(guild)
+            # Counter ids never collide with each other, only with legacy ids, which
+            # have to be probed for when the index can't reject them
+            if not self._game_ids_unique(guild) and self.find_match(game_id, guild):
+                continue
+            pending_record = {
+                "game_id": game_id,
+                "status": stc.PENDING,
+                "season_number": season_number,
+                "winner": winner.id,
+                "winning_deck": "",
+                "players": [
+                    {
+                        "user_id": user.id,
+                        "name": user.name,
+                        "deck": "",
+                        "confirmed": False
+                    } for user in users
+                ],
+                "timestamp": time.time(),
+                "replay_link": ""
+            }
+            try:
+                self.matches(guild).insert_one(pending_record)
+                self._summary_cache.invalidate(guild.id)
+                break
+            except DuplicateKeyError:
+                # the id was already taken by a match logged before ids were allocated from the counter
+                continue
+        self.push_pending_match(game_id, [user.id for user in users], guild)
         return game_id
 
     def delete_match(self, game_id, guild):
@@ -199,24 +579,20 @@ class RankDB(MongoClient):
 
         self.pull_pending_match(game_id, guild)
         self.matches(guild).delete_one({"game_id": game_id})
+        self._summary_cache.invalidate(guild.id)
 
     def find_match(self, game_id, guild):
         return self.matches(guild).find_one({"game_id": game_id})
 
-    def find_matches(self, query, guild, limit=0, season=None):
-        """season arg will return recent matches by default."""
+    def find_matches(self, query, guild, limit=0, season=None, projection=None, batch_size=0):
+        """season arg restricts the matches to those logged in that season.
+        projection restricts the returned fields, and batch_size sets how many matches
+        are fetched per round trip when the cursor is streamed."""
 
-        if not season:
-            return self.matches(guild).find(query, limit=limit, sort=[("timestamp", DESCENDING)])
-        else:
-            season_info = self.get_season(guild, season)
-            if not season_info:
-                return None
-            if "end_time" in season_info:
-                query["timestamp"] = {"$gte": season_info["start_time"], "$lt": season_info["end_time"]}
-                return self.matches(guild).find(query, limit=limit, sort=[("timestamp", DESCENDING)])
-            query["timestamp"] = {"$gte": season_info["start_time"]}
-            return self.matches(guild).find(query, limit=limit, sort=[("timestamp", DESCENDING)])
+        if season:
+            query["season_number"] = season
+        return self.matches(guild).find(
+            query, projection, limit=limit, batch_size=batch_size, sort=[("timestamp", DESCENDING)])
 
     def find_matches_with_deck(self, deck_name, guild, limit=0, season=None):
         """season arg will return current season matches by default."""
@@ -231,7 +607,7 @@ class RankDB(MongoClient):
         return self.matches(guild).update_one(query, modifier)
 
     def count_matches(self, query, guild):
-        return self.matches(guild).count(query)
+        return self.matches(guild).count_documents(query)
 
     def set_match_status(self, status, game_id, guild):
         self.matches(guild).update_one(
@@ -240,30 +616,73 @@ class RankDB(MongoClient):
                 "$set": {"status": status}
             }
         )
+        self._summary_cache.invalidate(guild.id)
+
+    def get_league_summary(self, guild):
+        """Returns the member count, current season, accepted match counts and the ids of
+        pending and disputed matches. Match figures come from a single aggregation, and
+        the result is cached briefly per guild."""
+
+        summary = self._summary_cache.get(guild.id)
+        if summary is not None:
+            return summary
+        season = self.get_season(guild)
+        game_ids = [{"$sort": {"timestamp": DESCENDING}}, {"$project": {"_id": 0, "game_id": 1}}]
+        facets = next(self.matches(guild).aggregate([
+            {"$project": {"_id": 0, "status": 1, "season_number": 1, "timestamp": 1, "game_id": 1}},
+            {"$facet": {
+                "accepted": [
+                    {"$match": {"status": stc.ACCEPTED}},
+                    {"$count": "count"}
+                ],
+                "season_accepted": [
+                    {"$match": {"status": stc.ACCEPTED, "season_number": season["season_number"]}},
+                    {"$count": "count"}
+                ],
+                "pending": [{"$match": {"status": stc.PENDING}}] + game_ids,
+                "disputed": [{"$match": {"status": stc.DISPUTED}}] + game_ids
+            }}
+        ]))
+        summary = {
+            "members": self.count_members(guild),
+            "season_number": season["season_number"],
+            "accepted": facets["accepted"][0]["count"] if facets["accepted"] else 0,
+            "season_accepted": facets["season_accepted"][0]["count"] if facets["season_accepted"] else 0,
+            "pending": [match["game_id"] for match in facets["pending"]],
+            "disputed": [match["game_id"] for match in facets["disputed"]]
+        }
+        self._summary_cache.set(guild.id, summary)
+        return summary
 
     def confirm_match_for_user(self, game_id, user_id, deck_name, guild):
-        match = self.find_match(game_id, guild)
-        if user_id == match["winner"]:
-            return self.matches(guild).update_one(
-                {"game_id": game_id, "players.user_id": user_id},
-                {
-                    "$set": {
-                        "players.$.confirmed": True,
-                        "players.$.deck": deck_name,
-                        "winning_deck": deck_name
-                    }
-                }
-            )
-        else:
-            return self.matches(guild).update_one(
+        """Confirms the match for the user and sets their deck. If the match was already
+        accepted, e.g. when an admin corrects a deck, the stats recorded at acceptance are
+        moved to the new deck. Returns the match as it was before the update, or None if
+        the user did not play in it."""
+
+        def confirm(session):
+            match = self.matches(guild).find_one_and_update(
                 {"game_id": game_id, "players.user_id": user_id},
                 {
                     "$set": {
                         "players.$.confirmed": True,
                         "players.$.deck": deck_name
                     }
-                }
+                },
+                session=session
             )
+            if not match:
+                return None
+            if user_id == match["winner"]:
+                self.matches(guild).update_one(
+                    {"game_id": game_id}, {"$set": {"winning_deck": deck_name}}, session=session)
+            old_deck = next(player["deck"] for player in match["players"] if player["user_id"] == user_id)
+            if match["status"] == stc.ACCEPTED and old_deck != deck_name:
+                self._change_player_deck(match, user_id, old_deck, deck_name, guild, session=session)
+            return match
+
+        with self._stats_lock(guild):
+            return self._run_in_transaction(confirm)
 
     def confirm_match_for_users(self, game_id, guild):
         self.matches(guild).update_one(
@@ -285,59 +704,346 @@ class RankDB(MongoClient):
             }
         )
 
-    def _find_unconfirmed_player(self, players):
-        """Returns the first player that hasn't confirmed a match. Returns None if no players found."""
+    def check_match_status(self, game_id, guild):
+        """Accepts the match if every player has confirmed it and applies the results.
+        Returns the point changes, or False if the match is not ready or was already accepted.
 
-        return next((i for i in players if not i["confirmed"]), None)
+        Without transactions the status flip and the result writes are separate writes.
+        Everything that can fail on the league's data is checked before the flip, but if
+        the server fails partway through the writes the match stays accepted with only
+        some of its results applied."""
 
-    def check_match_status(self, game_id, guild):
-        match = self.find_match(game_id, guild)
-        if match["status"] == stc.ACCEPTED:
-            return False
-        if self._find_unconfirmed_player(match["players"]):
-            return False
-        # all players have confirmed the result
-        self.set_match_status(stc.ACCEPTED, game_id, guild)
-        self.members(guild).update_many({"pending": game_id}, {"$inc": {"accepted": 1}})
-        delta = self.update_scores(match, guild)
-        self.pull_pending_match(game_id, guild)
+        ready = {
+            "game_id": game_id,
+            "status": {"$ne": stc.ACCEPTED},
+            "players.confirmed": {"$ne": False}
+        }
+
+        def accept(session):
+            match = self.matches(guild).find_one(ready, session=session)
+            if not match:
+                return False
+            members = self._find_match_members(match, guild, session=session)
+            if len(members) != len(match["players"]):
+                logging.error(f"Match {game_id} in {guild.id} has unregistered players, not accepting it")
+                return False
+            season_number = self._match_season_number(match, guild)
+
+            # Flipping the status only when all players have confirmed makes acceptance
+            # happen exactly once, even if two confirmations race.
+            match = self.matches(guild).find_one_and_update(
+                ready, {"$set": {"status": stc.ACCEPTED}}, session=session)
+            if not match:
+                return False
+            delta = self.update_scores(match, members, season_number, guild, session=session)
+            self.update_deck_stats(match, season_number, guild, session=session)
+            self.update_head_to_head(match, guild, session=session)
+            return delta
+
+        with self._stats_lock(guild):
+            delta = self._run_in_transaction(accept)
+        if delta:
+            self._summary_cache.invalidate(guild.id)
+            self._invalidate_leaderboards(guild)
         return delta
 
-    def update_scores(self, match, guild):
-        winner = self.find_member(match["winner"], guild)
+    def _match_season_number(self, match, guild):
+        return match.get("season_number") or self.get_season(guild)["season_number"]
+
+    def _change_player_deck(self, match, user_id, old_deck, new_deck, guild, session=None):
+        """Moves the stats a player's deck got when the match was accepted from old_deck to
+        new_deck, in deck_stats, the member's own deck_stats and their recent_decks."""
+
+        self.members(guild).update_one(
+            {"user_id": user_id, "recent_decks.game_id": match["game_id"]},
+            {"$set": {"recent_decks.$[entry].deck": new_deck}},
+            array_filters=[{"entry.game_id": match["game_id"]}], session=session
+        )
+        if match["timestamp"] <= system.deck_tracking_start_date:
+            return
+        season_number = self._match_season_number(match, guild)
+        win = 1 if user_id == match["winner"] else 0
+        counters = {
+            "entries": 1,
+            "wins": win,
+            f"seasons.{season_number}.entries": 1,
+            f"seasons.{season_number}.wins": win
+        }
+        old_deck_update = {"$inc": {key: -value for key, value in counters.items()}}
+        still_played = self.matches(guild).find_one(
+            {
+                "status": stc.ACCEPTED,
+                "timestamp": {"$gt": system.deck_tracking_start_date},
+                "players": {"$elemMatch": {"user_id": user_id, "deck": old_deck}}
+            },
+            {"_id": 1}, session=session
+        )
+        if not still_played:
+            old_deck_update["$pull"] = {"players": user_id}
+        self.deck_stats(guild).bulk_write([
+            UpdateOne({"name": old_deck}, old_deck_update),
+            DeleteOne({"name": old_deck, "entries": {"$lte": 0}}),
+            UpdateOne(
+                {"name": new_deck},
+                {"$inc": counters, "$addToSet": {"players": user_id}},
+                upsert=True
+            )
+        ], session=session)
+
+        old_field = f"deck_stats.{deck_field(old_deck)}"
+        new_field = f"deck_stats.{deck_field(new_deck)}"
+        member_update = {
+            "$inc": dict(
+                {f"{old_field}.{key}": -value for key, value in counters.items()},
+                **{f"{new_field}.{key}": value for key, value in counters.items()}
+            ),
+            "$set": {f"{new_field}.name": new_deck}
+        }
+        self.members(guild).bulk_write([
+            UpdateOne({"user_id": user_id}, member_update),
+            UpdateOne(
+                {"user_id": user_id, f"{old_field}.entries": {"$lte": 0}},
+                {"$unset": {old_field: ""}}
+            )
+        ], session=session)
+
+    def _add_member_deck_stats(self, updates, match, season_number):
+        """Adds each player's deck counters to their pending member update."""
+
+        if match["timestamp"] <= system.deck_tracking_start_date:
+            return
+        for player in match["players"]:
+            win = 1 if player["user_id"] == match["winner"] else 0
+            field = f"deck_stats.{deck_field(player['deck'])}"
+            update = updates[player["user_id"]]
+            update["$inc"].update({
+                f"{field}.entries": 1,
+                f"{field}.wins": win,
+                f"{field}.seasons.{season_number}.entries": 1,
+                f"{field}.seasons.{season_number}.wins": win
+            })
+            update.setdefault("$set", {})[f"{field}.name"] = player["deck"]
+
+    def _find_match_members(self, match, guild, session=None):
+        """Returns the member documents of the match's players, by user id."""
+
+        user_ids = [player["user_id"] for player in match["players"]]
+        return {
+            member["user_id"]: member
+            for member in self.members(guild).find({"user_id": {"$in": user_ids}}, session=session)
+        }
+
+    def update_scores(self, match, members, season_number, guild, session=None):
+        winner = members[match["winner"]]
         losers = [
-            self.find_member(player["user_id"], guild)
+            members[player["user_id"]]
             for player in match["players"] if player["user_id"] != match["winner"]]
         gains = 0
         delta = []
+        updates = {
+            player["user_id"]: {
+                "$inc": {"accepted": 1},
+                "$pull": {"pending": match["game_id"]},
+                "$push": {
+                    "recent_decks": {
+                        "$each": [{"game_id": match["game_id"], "deck": player["deck"]}],
+                        "$slice": -system.favorite_deck_window
+                    }
+                }
+            } for player in match["players"]
+        }
         for member in losers:
             avg_opponent_score = (sum([i["points"] for i in losers if i != member]) + winner["points"])/3.0
             score_diff = member["points"] - avg_opponent_score
             loss = int(round(12.0/(1+1.0065**(-score_diff)) + 4))
             gains += loss
-            self.members(guild).update_one(
-                {"user_id": member["user_id"]},
-                {
-                    "$inc": {
-                        "points": -loss,
-                        "losses": 1
-                    }
-                }
-            )
+            updates[member["user_id"]]["$inc"].update({
+                "points": -loss,
+                "losses": 1
+            })
             delta.append({"player": member["name"], "change": -loss})
-        self.members(guild).update_one(
-            {"user_id": match["winner"]},
-            {
-                "$inc": {
-                    "points": gains,
-                    "wins": 1
-                }
-            }
+        updates[match["winner"]]["$inc"].update({
+            "points": gains,
+            "wins": 1
+        })
+        self._add_member_deck_stats(updates, match, season_number)
+        self.members(guild).bulk_write(
+            [UpdateOne({"user_id": user_id}, update) for user_id, update in updates.items()],
+            session=session
         )
         delta.append({"player": winner["name"], "change": gains})
         return delta
 
     
+    # Deck stats
+    def _deck_stats_updates(self, match, season_number):
+        """Returns the deck_stats upserts that record an accepted match."""
+
+        updates = []
+        for player in match["players"]:
+            win = 1 if player["user_id"] == match["winner"] else 0
+            updates.append(UpdateOne(
+                {"name": player["deck"]},
+                {
+                    "$inc": {
+                        "entries": 1,
+                        "wins": win,
+                        f"seasons.{season_number}.entries": 1,
+                        f"seasons.{season_number}.wins": win
+                    },
+                    "$addToSet": {"players": player["user_id"]}
+                },
+                upsert=True
+            ))
+        return updates
+
+    def update_deck_stats(self, match, season_number, guild, session=None):
+        if match["timestamp"] <= system.deck_tracking_start_date:
+            return
+        self.deck_stats(guild).bulk_write(
+            self._deck_stats_updates(match, season_number), ordered=False, session=session)
+
+    def find_deck_stats(self, guild):
+        return self.deck_stats(guild).find({})
+
+    def update_head_to_head(self, match, guild, session=None):
+        self.head_to_head(guild).bulk_write(_head_to_head_updates(match), ordered=False, session=session)
+
+    def find_head_to_head(self, user_ids, guild):
+        """Returns the games and wins by player of the accepted matches containing all of
+        user_ids. Until the head_to_head store has been built from the league's history
+        (see ensure_stats) it would only hold the matches accepted since, so they are
+        counted with an aggregation over the matches instead."""
+
+        config = self.get_config(guild) or {}
+        if config.get("stats_version", 0) >= STATS_VERSION:
+            record = self.head_to_head(guild).find_one({"_id": pod_key(user_ids)})
+            return record or {"players": sorted(user_ids), "games": 0, "wins": {}}
+        record = {"players": sorted(user_ids), "games": 0, "wins": {}}
+        results = self.matches(guild).aggregate([
+            {"$match": {"status": stc.ACCEPTED, "players.user_id": {"$all": list(user_ids)}}},
+            {"$group": {"_id": "$winner", "wins": {"$sum": 1}}}
+        ])
+        for result in results:
+            record["games"] += result["wins"]
+            if result["_id"] in user_ids:
+                record["wins"][str(result["_id"])] = result["wins"]
+        return record
+
+    def _stats_lock(self, guild):
+        """Returns the lock that keeps the guild's incremental stats updates (match acceptance
+        and deck corrections) from landing between a rebuild's read of the matches and its
+        writes, which would wipe them."""
+
+        with self._stats_locks_lock:
+            return self._stats_locks.setdefault(guild.id, threading.Lock())
+
+    def rebuild_stats(self, guild):
+        """Recompute the deck_stats and head_to_head collections and the members' deck stats
+        and recent decks from all accepted matches, and record the current STATS_VERSION.
+        Run by ensure_stats for leagues that predate them, or to repair them by hand.
+        Matches accepted or corrected while it runs wait for it, and are applied on top."""
+
+        with self._stats_lock(guild):
+            return self._rebuild_stats(guild)
+
+    def _rebuild_stats(self, guild):
+        self.backfill_match_seasons(guild)
+        matches = self.matches(guild).find(
+            {"status": stc.ACCEPTED},
+            {
+                "_id": 0, "game_id": 1, "timestamp": 1, "season_number": 1, "winner": 1,
+                "players.deck": 1, "players.user_id": 1
+            },
+            sort=[("timestamp", ASCENDING)],
+            batch_size=system.match_stats_batch_size
+        )
+        decks = {}
+        member_decks = {}
+        recent_decks = {}
+        pods = {}
+        for match in matches:
+            user_ids = [player["user_id"] for player in match["players"]]
+            for player in match["players"]:
+                recent = recent_decks.setdefault(player["user_id"], [])
+                recent.append({"game_id": match["game_id"], "deck": player["deck"]})
+                del recent[:-system.favorite_deck_window]
+            for size in range(2, len(user_ids) + 1):
+                for group in itertools.combinations(user_ids, size):
+                    pod = pods.setdefault(pod_key(group), {
+                        "_id": pod_key(group),
+                        "players": sorted(group),
+                        "games": 0,
+                        "wins": {}
+                    })
+                    pod["games"] += 1
+                    if match["winner"] in group:
+                        winner = str(match["winner"])
+                        pod["wins"][winner] = pod["wins"].get(winner, 0) + 1
+            if match["timestamp"] <= system.deck_tracking_start_date:
+                continue
+            season_number = str(match["season_number"])
+            for player in match["players"]:
+                win = 1 if player["user_id"] == match["winner"] else 0
+                member_deck = member_decks.setdefault(player["user_id"], {}).setdefault(
+                    deck_field(player["deck"]),
+                    {"name": player["deck"], "entries": 0, "wins": 0, "seasons": {}}
+                )
+                member_deck["entries"] += 1
+                member_deck["wins"] += win
+                season = member_deck["seasons"].setdefault(season_number, {"entries": 0, "wins": 0})
+                season["entries"] += 1
+                season["wins"] += win
+                deck = decks.setdefault(player["deck"], {
+                    "name": player["deck"],
+                    "entries": 0,
+                    "wins": 0,
+                    "players": set(),
+                    "seasons": {}
+                })
+                deck["entries"] += 1
+                deck["wins"] += win
+                deck["players"].add(player["user_id"])
+                season = deck["seasons"].setdefault(season_number, {"entries": 0, "wins": 0})
+                season["entries"] += 1
+                season["wins"] += win
+        for deck in decks.values():
+            deck["players"] = list(deck["players"])
+
+        self.deck_stats(guild).delete_many({})
+        if decks:
+            self.deck_stats(guild).insert_many(list(decks.values()))
+        self.members(guild).update_many({}, {"$unset": {"deck_stats": "", "recent_decks": ""}})
+        if recent_decks:
+            self.members(guild).bulk_write([
+                UpdateOne({"user_id": user_id}, {"$set": {
+                    "deck_stats": member_decks.get(user_id, {}),
+                    "recent_decks": recent
+                }})
+                for user_id, recent in recent_decks.items()
+            ], ordered=False)
+        self.head_to_head(guild).delete_many({})
+        if pods:
+            self.head_to_head(guild).insert_many(list(pods.values()))
+        self._set_config({"stats_version": STATS_VERSION}, guild)
+        return len(decks)
+
+    def ensure_stats(self, guild):
+        """Backfills match seasons, and rebuilds the stats if the guild's config records
+        an older STATS_VERSION, e.g. in leagues that predate them. Returns True if the
+        stats were rebuilt."""
+
+        config = self.get_config(guild)
+        if config is None:
+            return False
+        if config.get("stats_version", 0) >= STATS_VERSION:
+            self.backfill_match_seasons(guild)
+            return False
+        logging.info(f"Rebuilding stats in {guild.id} to version {STATS_VERSION}")
+        self.rebuild_stats(guild)
+        return True
+
+
     # Deck methods
     def set_deck(self, deck_name, user, guild):
         self.members(guild).update_one(
@@ -349,7 +1055,7 @@ class RankDB(MongoClient):
             }
         )
 
-    def add_deck(self, color, color_name, deck_name, aliases, commanders, link=""):
+    def add_deck(self, color, color_name, deck_name, aliases, commanders, link="", image_uris=None):
         decks = self.decks()
         document = {
             "name": deck_name,
@@ -360,18 +1066,43 @@ class RankDB(MongoClient):
             "canonical_aliases": [utils.transform_deck_name(alias) for alias in aliases],
             "commanders": commanders
         }
+        if image_uris:
+            document["image_uris"] = image_uris
+            document["image_uris_updated"] = time.time()
         if not decks.find_one({"name": deck_name}):
             decks.insert_one(document)
+            self.invalidate_deck_index()
             return 1
         else:
             decks.find_one_and_replace({"name": deck_name}, document)
+            self.invalidate_deck_index()
             return 0
 
+    def load_deck_index(self):
+        """Returns the in-memory deck index, loading it from the decks collection if needed.
+        The index maps each canonical alias to its deck document and each deck name to
+        its shortest alias, so deck lookups don't need a query."""
+
+        with self._deck_index_lock:
+            if self._deck_index is None:
+                aliases = {}
+                short_names = {}
+                for deck in self.decks().find({}):
+                    for alias in deck["canonical_aliases"]:
+                        aliases[alias] = deck
+                    short_names[deck["name"]] = sorted(deck["aliases"], key=(lambda n: len(n)))[0]
+                self._deck_index = {"aliases": aliases, "short_names": short_names}
+            return self._deck_index
+
+    def invalidate_deck_index(self):
+        with self._deck_index_lock:
+            self._deck_index = None
+
     def find_deck(self, alias):
         if alias.lower() == "rogue":
             return {"name": "Rogue"}
         canonical_name = utils.transform_deck_name(alias)
-        return self.decks().find_one({"canonical_aliases": canonical_name})
+        return self.load_deck_index()["aliases"].get(canonical_name)
 
     def find_decks(self, query):
         return self.decks().find(query)
@@ -379,7 +1110,7 @@ class RankDB(MongoClient):
     def add_deck_aliases(self, alias, new_aliases):
         canonical_name = utils.transform_deck_name(alias)
         new_canonical_aliases = list({utils.transform_deck_name(name) for name in new_aliases})
-        return self.decks().update_one({"canonical_aliases": canonical_name}, {
+        result = self.decks().update_one({"canonical_aliases": canonical_name}, {
             "$addToSet": {
                 "aliases": {
                     "$each": new_aliases
@@ -389,12 +1120,39 @@ class RankDB(MongoClient):
                 }
             }
         })
+        self.invalidate_deck_index()
+        return result
 
     def add_deck_link(self, alias, link):
         canonical_name = utils.transform_deck_name(alias)
-        return self.decks().update_one({"canonical_aliases": canonical_name}, {
+        result = self.decks().update_one({"canonical_aliases": canonical_name}, {
             "$set": { "link": link }
         })
+        self.invalidate_deck_index()
+        return result
+
+    def set_deck_image_uris(self, deck_name, image_uris):
+        result = self.decks().update_one({"name": deck_name}, {
+            "$set": {
+                "image_uris": image_uris,
+                "image_uris_updated": time.time()
+            }
+        })
+        # Only the art changed, so patch the loaded index instead of reloading every deck
+        with self._deck_index_lock:
+            if self._deck_index is not None:
+                for deck in self._deck_index["aliases"].values():
+                    if deck["name"] == deck_name:
+                        deck["image_uris"] = image_uris
+        return result
+
+    def find_decks_with_stale_images(self, max_age):
+        return self.decks().find({
+            "$or": [
+                {"image_uris_updated": {"$exists": False}},
+                {"image_uris_updated": {"$lt": time.time() - max_age}}
+            ]
+        })
 
     def find_one_deck_by_color(self, color):
         return self.decks().find_one({"color": utils.sort_color_str(color)})
@@ -402,21 +1160,45 @@ class RankDB(MongoClient):
     def find_decks_by_color(self, color):
         return self.decks().find({"color": utils.sort_color_str(color)})
 
+    def find_decklist(self, link):
+        return self.decklists().find_one({"link": link})
+
+    def save_decklist(self, link, decklist):
+        self.decklists().replace_one(
+            {"link": link},
+            {
+                "link": link,
+                "fetched_at": time.time(),
+                "decklist": decklist
+            },
+            upsert=True
+        )
+
     def get_deck_short_name(self, alias):
         deck = self.find_deck(alias)
-        shortest_name = sorted(deck['aliases'], key=(lambda n: len(n)))[0]
-        return shortest_name
+        return self.load_deck_index()["short_names"][deck["name"]]
 
     # Config
     def get_config(self, guild):
-        return self.config(guild).find_one()
+        config = self._config_cache.get(guild.id)
+        if config is None:
+            config = self.config(guild).find_one()
+            if config is not None:
+                self._config_cache.set(guild.id, config)
+        return config
+
+    def _set_config(self, fields, guild):
+        """Writes the fields to the guild config and stores the updated document in the cache."""
+
+        config = self.config(guild).find_one_and_update(
+            {}, {"$set": fields}, return_document=ReturnDocument.AFTER)
+        if config is None:
+            self._config_cache.invalidate(guild.id)
+        else:
+            self._config_cache.set(guild.id, config)
 
     def set_admin_role(self, role_name, guild):
-        self.config(guild).update_one({}, {
-            "$set": {
-                "admin": role_name
-            }
-        })
+        self._set_config({"admin": role_name}, guild)
 
     def get_admin_role(self, guild):
         config = self.get_config(guild)
@@ -425,11 +1207,8 @@ class RankDB(MongoClient):
         return None
 
     def set_player_match_threshold(self, threshold, guild):
-        self.config(guild).update_one({}, {
-            "$set": {
-                "player_match_threshold": threshold
-            }
-        })
+        self._set_config({"player_match_threshold": threshold}, guild)
+        self._invalidate_leaderboards(guild)
 
     def get_player_match_threshold(self, guild):
         config = self.get_config(guild)
@@ -438,11 +1217,7 @@ class RankDB(MongoClient):
         return system.min_matches
 
     def set_deck_match_threshold(self, threshold, guild):
-        self.config(guild).update_one({}, {
-            "$set": {
-                "deck_match_threshold": threshold
-            }
-        })
+        self._set_config({"deck_match_threshold": threshold}, guild)
 
     def get_deck_match_threshold(self, guild):
         config = self.get_config(guild)
@@ -452,62 +1227,170 @@ class RankDB(MongoClient):
 
     # Seasons
     def get_season(self, guild, season=None):
+        """Returns the season document for season, or the current season by default.
+        The current season is cached until the season is reset. A read that races with
+        a reset is not cached, since it may return the season being ended."""
+
         seasons = self.seasons(guild)
         if not season:
-            return seasons.find({}, limit=1, sort=[("start_time", DESCENDING)])[0]
+            current_season = self._season_cache.get(guild.id)
+            if current_season is not None:
+                return current_season
+            generation = self._season_cache.generation()
+            current_season = seasons.find({}, limit=1, sort=[("start_time", DESCENDING)])[0]
+            self._season_cache.set(guild.id, current_season, generation)
+            return current_season
         else:
             return seasons.find_one({"season_number": season})
 
+    def backfill_match_seasons(self, guild):
+        """Sets season_number on matches logged before it was stored, from the season
+        their timestamp falls in. Matches logged before the first season are assigned to it."""
+
+        seasons = list(self.seasons(guild).find({}, sort=[("start_time", ASCENDING)]))
+        if not seasons:
+            return 0
+        updates = []
+        for i, season in enumerate(seasons):
+            timestamp = {}
+            if i > 0:
+                timestamp["$gte"] = season["start_time"]
+            if i < len(seasons) - 1:
+                timestamp["$lt"] = seasons[i+1]["start_time"]
+            query = {"season_number": {"$exists": False}}
+            if timestamp:
+                query["timestamp"] = timestamp
+            updates.append(UpdateMany(query, {"$set": {"season_number": season["season_number"]}}))
+        return self.matches(guild).bulk_write(updates, ordered=False).modified_count
+
     def reset_scores(self, guild):
-        self.members(guild).update_many({}, 
-            {
-                "$set": {
-                    "points": system.base_points,
-                    "wins": 0,
-                    "accepted": 0,
-                    "losses": 0
-                }
-            })
+        self.members(guild).update_many({}, {"$set": RESET_SCORES})
+        self._invalidate_leaderboards(guild)
+
+    def find_standings(self, season_number, guild, limit=0, user_ids=None):
+        query = {"season_number": season_number}
+        if user_ids is not None:
+            query["user_id"] = {"$in": user_ids}
+        return self.standings(guild).find(query, limit=limit, sort=[("rank", ASCENDING)])
 
     def reset_season(self, guild):
-        # Record results from the current season
+        """Ends the current season and starts the next one, returning the number of the
+        ended season and its final standings. The standings rank every member by points,
+        whatever their match count; the player match threshold only decides who gets the
+        season's badges, and is left to callers when displaying the standings.
+
+        The current season's end_time marks a rollover in progress. Every step after it
+        is idempotent, so if a rollover is interrupted the next call resumes it: the
+        standings snapshot is only taken once, and members who already had their badges
+        and scores applied are skipped through their rollover_season. That is also why the
+        rollover is not one transaction: resetting every member of a large league at once
+        can outlast a transaction's time limit."""
+
+        # a cached current season may predate an interrupted rollover
+        self._season_cache.invalidate(guild.id)
         current_season = self.get_season(guild)
-        end_time = time.time()
-        leaders = list(self.find_top_members_by("points", guild, limit=3))
-        if not leaders:
-            self.seasons(guild).update_one(
-                {"season_number": current_season["season_number"]},
-                {
-                    "$set": {
-                        "end_time": end_time
-                    }
-                }
-            )
+        season_number = current_season["season_number"]
+        if "end_time" not in current_season:
+            current_season = self.seasons(guild).find_one_and_update(
+                {"season_number": season_number},
+                {"$set": {"end_time": time.time()}},
+                return_document=ReturnDocument.AFTER)
+        end_time = current_season["end_time"]
+
+        # Record results from the current season
+        if current_season.get("standings_recorded"):
+            standings = list(self.find_standings(season_number, guild))
+            leaders = current_season.get("season_leaders", [])
         else:
+            members = self.members(guild).find(
+                {},
+                {"_id": 0, "user_id": 1, "name": 1, "points": 1, "wins": 1, "losses": 1, "accepted": 1},
+                sort=[("points", DESCENDING), ("user_id", ASCENDING)]
+            )
+            standings = [
+                dict(member, _id=f"{season_number}-{rank}", season_number=season_number, rank=rank)
+                for rank, member in enumerate(members, 1)
+            ]
+            threshold = self.get_player_match_threshold(guild)
+            leaders = [standing["user_id"] for standing in standings if standing["accepted"] >= threshold][:3]
+            if standings:
+                self.standings(guild).bulk_write([
+                    ReplaceOne({"_id": standing["_id"]}, standing, upsert=True)
+                    for standing in standings
+                ])
+            self.standings(guild).delete_many(
+                {"season_number": season_number, "rank": {"$gt": len(standings)}})
             self.seasons(guild).update_one(
-                {"season_number": current_season["season_number"]},
+                {"season_number": season_number},
                 {
                     "$set": {
-                        "end_time": end_time,
-                        "season_leaders": [player["user_id"] for player in leaders]
+                        "season_leaders": leaders,
+                        "standings_recorded": True
                     }
                 }
             )
 
-        # Give season rewards
-        if leaders:
-            for i, badge in enumerate(["gold", "silver", "bronze"]):
-                self.members(guild).update_one(
-                    {"user_id": leaders[i]["user_id"]},
-                    {"$inc": {f"season_{badge}_badges": 1}}
-                )
-
-        self.reset_scores(guild)
+        # Give season rewards and reset scores
+        reset = {"$set": dict(RESET_SCORES, rollover_season=season_number)}
+        updates = [
+            UpdateOne(
+                {"user_id": user_id, "rollover_season": {"$ne": season_number}},
+                dict(reset, **{"$inc": {f"season_{badge}_badges": 1}})
+            ) for user_id, badge in zip(leaders, ["gold", "silver", "bronze"])
+        ]
+        updates.append(UpdateMany({"rollover_season": {"$ne": season_number}}, reset))
+        self.members(guild).bulk_write(updates)
 
         # Create new season
-        new_season = {
-            "start_time": end_time,
-            "season_number": current_season["season_number"]+1
-        }
-        self.seasons(guild).insert_one(new_season)
-        return current_season["season_number"], leaders
+        self.seasons(guild).update_one(
+            {"season_number": season_number+1},
+            {"$setOnInsert": {"start_time": end_time}},
+            upsert=True
+        )
+
+        self._season_cache.invalidate(guild.id)
+        self._summary_cache.invalidate(guild.id)
+        self._invalidate_leaderboards(guild)
+        return season_number, standings
+
+
+class AsyncRankDB(object):
+    """Awaitable facade over RankDB. Every RankDB method is exposed as a coroutine
+    that runs the blocking pymongo call in a thread pool, so a slow query does not
+    stall the event loop. Cursors are materialized into lists inside the worker
+    thread, since iterating them lazily would block the loop again.
+
+    The wrapped RankDB is available as `sync` for code that is already running
+    off the event loop (see `run`)."""
+
+    def __init__(self, db, max_workers=None):
+        self.sync = db
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rankdb")
+
+    def run(self, func, *args, **kwargs):
+        """Run a blocking callable in the database thread pool and return an awaitable."""
+
+        loop = asyncio.get_event_loop()
+        return loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def _call(self, method, *args, **kwargs):
+        result = method(*args, **kwargs)
+        if isinstance(result, (Cursor, CommandCursor)):
+            return list(result)
+        return result
+
+    def __getattr__(self, name):
+        if not hasattr(type(self.sync), name):
+            raise AttributeError(f"RankDB has no attribute '{name}'")
+        attr = getattr(self.sync, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def wrapper(*args, **kwargs):
+            return await self.run(self._call, attr, *args, **kwargs)
+        return wrapper
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.sync.close()
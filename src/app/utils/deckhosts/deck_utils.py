@@ -1,6 +1,6 @@
+import asyncio
 import logging
 import re
-import requests
 
 from app import exceptions as err
 from app.utils import scryfall, utils
@@ -19,15 +19,15 @@ def _get_color_identity(commanders):
             colors += commander["color_identity"]
     return utils.sort_color_str("".join(set(colors)))
 
-def extract(link):
+async def extract(link):
     if "tappedout" in link:
-        deck = tappedout.search(link)
+        deck = await tappedout.search(link)
     elif "deckstats" in link:
-        deck = deckstats.search(link)
+        deck = await deckstats.search(link)
     else:
         raise err.DeckNotFoundError()
 
-    commanders = [scryfall.search(cmdr_name) for cmdr_name in deck["commanders"]]
+    commanders = await asyncio.gather(*[scryfall.search(cmdr_name) for cmdr_name in deck["commanders"]])
     color_identity = _get_color_identity(commanders)
     deck["commanders"] = commanders
     deck["color_identity"] = color_identity
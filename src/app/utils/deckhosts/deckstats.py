@@ -1,7 +1,11 @@
+import asyncio
+import logging
 import re
-import requests
+
+import aiohttp
 
 from app import exceptions as err
+from app.utils import web
 from app.utils.deckhosts import deck_utils
 
 def _get_card_name(line):
@@ -28,11 +32,17 @@ def _parse_decklist(dlist):
             decklist[idx]['cards'].append({"name": name, "count": int(count)})
     return deck_utils.sort_categories(decklist)
 
-def search(link):
-    r = requests.get(f"{link}?export_txt=1")
+async def search(link):
+    try:
+        status, text = await web.client.get(f"{link}?export_txt=1")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logging.error(e)
+        raise err.DeckNotFoundError()
+    if status != 200:
+        raise err.DeckNotFoundError()
     cmdr_names = []
     try:
-        match = re.findall(r"Commander.*((\n[\w ,']*)+)", r.text)[0][0]
+        match = re.findall(r"Commander.*((\n[\w ,']*)+)", text)[0][0]
         _cmdrs = match.strip().split('\n')
         for _cmdr in _cmdrs:
             name = _get_card_name(_cmdr)
@@ -40,4 +50,4 @@ def search(link):
     except Exception as e:
         logging.error(e)
         raise err.DeckNotFoundError()
-    return {"commanders": cmdr_names, "decklist": _parse_decklist(r.text)}
+    return {"commanders": cmdr_names, "decklist": _parse_decklist(text)}
@@ -1,7 +1,11 @@
+import asyncio
+import logging
 import re
-import requests
+
+import aiohttp
 
 from app import exceptions as err
+from app.utils import web
 from app.utils.deckhosts import deck_utils
 
 def _get_card_name(line):
@@ -28,15 +32,21 @@ def _parse_decklist(dlist):
             decklist[idx]['cards'].append({"name": name, "count": int(count)})
     return deck_utils.sort_categories(decklist)
 
-def search(link):
+async def search(link):
     _slug_match = re.search(r'(?<=mtg-decks/).*?(?=/)', link)
     if not _slug_match:
         return []
     slug = _slug_match.group()
-    r = requests.get(f"http://tappedout.net/mtg-decks/{slug}/?fmt=markdown")
+    try:
+        status, text = await web.client.get(f"http://tappedout.net/mtg-decks/{slug}/?fmt=markdown")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logging.error(e)
+        raise err.DeckNotFoundError()
+    if status != 200:
+        raise err.DeckNotFoundError()
     cmdr_names = []
     try:
-        match = re.findall(r'### Commander.*((\n[*] 1.*)+)', r.text)[0][0]
+        match = re.findall(r'### Commander.*((\n[*] 1.*)+)', text)[0][0]
         _cmdrs = match.strip().split('\n')
         for _cmdr in _cmdrs:
             name = _get_card_name(_cmdr)
@@ -44,4 +54,4 @@ def search(link):
     except Exception as e:
         logging.error(e)
         raise err.DeckNotFoundError()
-    return {"commanders": cmdr_names, "decklist": _parse_decklist(r.text)}
+    return {"commanders": cmdr_names, "decklist": _parse_decklist(text)}
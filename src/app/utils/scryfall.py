@@ -1,18 +1,77 @@
-import requests
+import asyncio
+import hashlib
+import json
+import logging
+import os
+
+import aiohttp
 
 from app import exceptions as err
+from app.utils import cache, web
+
+# Scryfall asks for 50-100 milliseconds between requests
+RATE_LIMIT = 0.1
+CACHE_DIR = "../cache/scryfall"
+
+_cards = cache.Cache(maxsize=2048)
 
-def search(card_name):
+def _cache_key(card_name):
+    return " ".join(card_name.lower().split())
+
+def _cache_path(key):
+    return os.path.join(CACHE_DIR, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json")
+
+def _read_cached_card(key):
     try:
-        params = {"fuzzy": card_name}
-        r = requests.get("https://api.scryfall.com/cards/named", params=params)
-    except Exception as e:
+        with open(_cache_path(key), "r") as infile:
+            return json.load(infile)
+    except (OSError, ValueError):
+        return None
+
+def _write_cached_card(key, card):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(_cache_path(key), "w") as outfile:
+            json.dump(card, outfile)
+    except OSError as e:
         logging.error(e)
-        raise err.CardNotFoundError()
-    else:
-        return r.json()
+
+async def search(card_name, use_cache=True):
+    """Fuzzy search for a card. Results are cached in memory and on disk by the
+    normalized search string, so repeated searches never leave the process.
+    Set use_cache to False to re-fetch the card and overwrite the cached copy."""
+
+    key = _cache_key(card_name)
+    card = _cards.get(key) if use_cache else None
+    if card is not None:
+        return card
+    # disk access runs in the default executor so it doesn't stall the event loop
+    loop = asyncio.get_event_loop()
+    card = await loop.run_in_executor(None, _read_cached_card, key) if use_cache else None
+    if card is None:
+        try:
+            status, card = await web.client.get(
+                "https://api.scryfall.com/cards/named",
+                params={"fuzzy": card_name},
+                json=True,
+                min_interval=RATE_LIMIT
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            logging.error(e)
+            raise err.CardNotFoundError()
+        if status != 200:
+            raise err.CardNotFoundError()
+        await loop.run_in_executor(None, _write_cached_card, key, card)
+    _cards.set(key, card)
+    return card
 
 def get_image_uris(card):
     if "card_faces" in card:
         return card['card_faces'][0]['image_uris']
     return card['image_uris']
+
+def get_deck_image_uris(card):
+    """Returns the subset of a commander's image URIs that is stored on deck documents."""
+
+    image_uris = get_image_uris(card)
+    return {"small": image_uris["small"], "art_crop": image_uris["art_crop"]}
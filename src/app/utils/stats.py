@@ -0,0 +1,49 @@
+import numpy as np
+
+# scipy is imported inside the functions that need it, so loading the cogs
+# does not pay for importing it
+
+def confint_95(successes, samples):
+    """Clopper-Pearson 95% confidence interval for a binomial proportion.
+    Accepts scalars or arrays and returns a (lower, upper) pair of the same shape."""
+
+    import scipy.stats as st
+
+    successes = np.asarray(successes, dtype=float)
+    samples = np.asarray(samples, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        lower = st.beta.ppf(0.025, successes, samples - successes + 1)
+        upper = st.beta.ppf(0.975, successes + 1, samples - successes)
+    lower = np.where(successes == 0, 0.0, lower)
+    upper = np.where(successes == samples, 1.0, upper)
+    return lower, upper
+
+def binom_test_greater(successes, samples, p):
+    """One-sided binomial test p-value, P(X >= successes) for X ~ B(samples, p). Vectorized."""
+
+    import scipy.stats as st
+
+    successes = np.asarray(successes)
+    return st.binom.sf(successes - 1, samples, p)
+
+def compute_deck_stats(decks, total_entries):
+    """Computes the stats of every deck in one batched call. decks is a list of dicts
+    with entries and wins, and total_entries is the number of deck entries in the league.
+    Each dict is updated with losses, winrate, meta, confint (95%) and p_value, the
+    probability of winning at least as often by chance in a 4 player pod."""
+
+    if not decks:
+        return decks
+    entries = np.array([deck["entries"] for deck in decks], dtype=float)
+    wins = np.array([deck["wins"] for deck in decks], dtype=float)
+    winrate = wins/entries
+    meta = entries/total_entries
+    lower, upper = confint_95(wins, entries)
+    p_value = binom_test_greater(wins, entries, 0.25)
+    for i, deck in enumerate(decks):
+        deck["losses"] = deck["entries"] - deck["wins"]
+        deck["winrate"] = float(winrate[i])
+        deck["meta"] = float(meta[i])
+        deck["confint"] = (float(lower[i]), float(upper[i]))
+        deck["p_value"] = float(p_value[i])
+    return decks
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+
+import discord
+
+from app.constants import system
+from app.utils import cache
+
+class UserResolver(object):
+    """Resolves user ids to discord users. Users are looked up in the gateway cache first,
+    then in an LRU of previously fetched users, and only the remaining ids are fetched
+    from the API, concurrently but at most `concurrency` at a time. Concurrent lookups
+    of the same id share a single fetch."""
+
+    def __init__(self, bot, maxsize=system.user_cache_size, concurrency=system.user_fetch_concurrency):
+        self.bot = bot
+        self.concurrency = concurrency
+        self._cache = cache.Cache(maxsize=maxsize)
+        self._semaphore = None
+        self._fetching = {}
+
+    def get(self, user_id, guild=None):
+        """Returns the user if it is cached, otherwise None."""
+
+        user = self.bot.get_user(user_id)
+        if user is None and guild is not None:
+            user = guild.get_member(user_id)
+        if user is None:
+            user = self._cache.get(user_id)
+        return user
+
+    async def fetch(self, user_id, guild=None):
+        users = await self.fetch_many([user_id], guild)
+        return users.get(int(user_id))
+
+    async def fetch_many(self, user_ids, guild=None):
+        """Returns a dict of user id to user for user_ids. Users that can't be fetched are left out."""
+
+        users = {}
+        missing = []
+        for user_id in dict.fromkeys(int(user_id) for user_id in user_ids):
+            user = self.get(user_id, guild)
+            if user is None:
+                missing.append(user_id)
+            else:
+                users[user_id] = user
+        results = await asyncio.gather(*[self._fetch(user_id) for user_id in missing])
+        for user_id, user in zip(missing, results):
+            if user is not None:
+                users[user_id] = user
+        return users
+
+    def stats(self):
+        return self._cache.stats()
+
+    async def _fetch(self, user_id):
+        task = self._fetching.get(user_id)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_user(user_id))
+            self._fetching[user_id] = task
+            task.add_done_callback(lambda _: self._fetching.pop(user_id, None))
+        return await task
+
+    async def _fetch_user(self, user_id):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            try:
+                user = await self.bot.fetch_user(user_id)
+            except discord.HTTPException as e:
+                logging.warning(f"Could not fetch user {user_id}: {e}")
+                return None
+        self._cache.set(user_id, user)
+        return user
@@ -1,10 +1,7 @@
 from datetime import datetime
 import re
-import statsmodels.stats.proportion as stats
 
-from app.constants import status_codes as stc
-from app.constants import system
-from app.utils import embed, line_table
+from app.utils import embed, line_table, stats
 
 DEFAULT_LIMIT = 10
 
@@ -18,6 +15,18 @@ def get_target_users(ctx):
         return ctx.message.mentions
     return [ctx.message.author]
 
+async def get_member(ctx, user_id=None):
+    """Returns the member document for user_id, or for the author of the message if no
+    user_id is given. Documents are cached on ctx so a command fetches each member at most once."""
+
+    if user_id is None:
+        user_id = ctx.message.author.id
+    if not hasattr(ctx, "member_cache"):
+        ctx.member_cache = {}
+    if user_id not in ctx.member_cache:
+        ctx.member_cache[user_id] = await ctx.bot.db.find_member(user_id, ctx.message.guild)
+    return ctx.member_cache[user_id]
+
 def get_avatar(user):
     if not user.avatar_url:
         return user.default_avatar_url
@@ -37,27 +46,16 @@ def get_command_arg(args, key, default):
     return default
 
 # deck data processing
-def get_match_stats(ctx):
-    matches = ctx.bot.db.find_matches(
-        {
-            "timestamp": {"$gt": system.deck_tracking_start_date}, 
-            "status": stc.ACCEPTED
-        }, ctx.message.guild)
-    if not matches:
+async def get_match_stats(ctx):
+    deck_stats = await ctx.bot.db.find_deck_stats(ctx.message.guild)
+    if not deck_stats:
         return None
-    return process_match_stats(ctx, matches)
-
-def get_player_match_stats(ctx, user):
-    matches = ctx.bot.db.find_matches(
-        {
-            "timestamp": {"$gt": system.deck_tracking_start_date},
-            "status": stc.ACCEPTED,
-            "players.user_id": user.id
-        }, ctx.message.guild
-    )
-    if not matches:
-        return None
-    return process_player_match_stats(ctx, user, matches)
+    return await ctx.bot.db.run(process_deck_stats, ctx, deck_stats)
+
+async def get_player_match_stats(ctx, user):
+    member = await get_member(ctx, user.id)
+    deck_stats = member.get("deck_stats", {}) if member else {}
+    return await ctx.bot.db.run(process_player_deck_stats, ctx, deck_stats.values())
 
 def get_deck_short_name(ctx, deck_name, cache):
     if not deck_name:
@@ -66,51 +64,45 @@ def get_deck_short_name(ctx, deck_name, cache):
         # already short enough
         return deck_name
     if deck_name not in cache:
-        cache[deck_name] = ctx.bot.db.get_deck_short_name(deck_name)
+        cache[deck_name] = ctx.bot.db.sync.get_deck_short_name(deck_name)
     return cache[deck_name]
 
-def process_match_stats(ctx, matches):
+# process_* helpers query the database synchronously
+# and should be run off the event loop with ctx.bot.db.run
+def process_deck_stats(ctx, deck_stats):
     decks = {}
     name_cache = {}
-    for match in matches:
-        for player in match["players"]:
-            deck_name = player["deck"]
-            deck_name = get_deck_short_name(ctx, deck_name, name_cache)
-            if deck_name in decks:
-                decks[deck_name]["entries"] += 1
-                decks[deck_name]["players"].add(player["user_id"])
-            else:
-                decks[deck_name] = {
-                    "name": deck_name,
-                    "entries": 1,
-                    "players": {player["user_id"]},
-                    "wins": 0
-                }
-        winning_deck = get_deck_short_name(ctx, match["winning_deck"], name_cache)
-        decks[winning_deck]["wins"] += 1
+    for record in deck_stats:
+        deck_name = get_deck_short_name(ctx, record["name"], name_cache)
+        if deck_name in decks:
+            decks[deck_name]["entries"] += record["entries"]
+            decks[deck_name]["wins"] += record["wins"]
+            decks[deck_name]["players"].update(record["players"])
+        else:
+            decks[deck_name] = {
+                "name": deck_name,
+                "entries": record["entries"],
+                "players": set(record["players"]),
+                "wins": record["wins"]
+            }
     total_entries = sum([decks[deck_name]['entries'] for deck_name in decks])
-    deck_match_threshold = ctx.bot.db.get_deck_match_threshold(ctx.message.guild)
+    deck_match_threshold = ctx.bot.db.sync.get_deck_match_threshold(ctx.message.guild)
     list_decks = [decks[i] for i in decks if (i != "Unknown" and decks[i]["entries"] >= deck_match_threshold)]
-    for deck in list_decks:
-        deck["winrate"] = deck["wins"]/deck["entries"]
-        deck["meta"] = deck["entries"]/total_entries
-        deck["losses"] = deck["entries"] - deck["wins"]
-    return list_decks
+    return stats.compute_deck_stats(list_decks, total_entries)
 
-def process_player_match_stats(ctx, user, matches):
+def process_player_deck_stats(ctx, deck_stats):
     decks = {}
     name_cache = {}
-    for match in matches:
-        deck_name = get_player_deck(user.id, match)
-        deck_name = get_deck_short_name(ctx, deck_name, name_cache)
+    for record in deck_stats:
+        deck_name = get_deck_short_name(ctx, record["name"], name_cache)
         if deck_name in decks:
-            decks[deck_name]["entries"] += 1
-            decks[deck_name]["wins"] += 1 if match["winner"] == user.id else 0
+            decks[deck_name]["entries"] += record["entries"]
+            decks[deck_name]["wins"] += record["wins"]
         else:
             decks[deck_name] = {
                 "name": deck_name,
-                "entries": 1,
-                "wins": 1 if match["winner"] == user.id else 0
+                "entries": record["entries"],
+                "wins": record["wins"]
             }
     list_decks = decks.values()
     for deck in list_decks:
@@ -162,8 +154,8 @@ def get_appearances(match, deck_name):
 def confint_95(success, samples):
     """Uses Clopper-Pearson method with 95% confidence"""
 
-    return stats.proportion_confint(
-        success, samples, alpha=0.05, method='beta')
+    lower, upper = stats.confint_95(success, samples)
+    return float(lower), float(upper)
 
 def confint_95_diff(success, samples):
     """Return the +/- value on the proportion for a 90% confint"""
@@ -186,7 +178,7 @@ def get_player_deck(user_id, match):
 def shorten_deck_name(ctx, name, maxlen=16):
     if len(name) <= maxlen:
         return name
-    shortened = ctx.bot.db.get_deck_short_name(name)
+    shortened = ctx.bot.db.sync.get_deck_short_name(name)
     if len(shortened) <= maxlen:
         return shortened
     return shortened[:(maxlen-3)] + "..."
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+import time
+
+import aiohttp
+import yarl
+
+class HttpClient(object):
+    """Shared HTTP client for external APIs. Requests go through one pooled aiohttp
+    session with a timeout, are retried with exponential backoff on connection
+    errors, 429s and 5xx responses, and can be spaced out per host to respect
+    rate limits."""
+
+    def __init__(self, timeout=10, retries=3, backoff=0.5, connection_limit=20):
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.connection_limit = connection_limit
+        self._session = None
+        self._host_locks = {}
+        self._last_request = {}
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=self.timeout,
+                connector=aiohttp.TCPConnector(limit=self.connection_limit)
+            )
+        return self._session
+
+    async def _wait_for_host(self, host, min_interval):
+        """Sleeps until at least min_interval seconds have passed since the last request to host."""
+
+        if not min_interval:
+            return
+        lock = self._host_locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            delay = self._last_request.get(host, 0) + min_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._last_request[host] = time.monotonic()
+
+    async def get(self, url, params=None, json=False, min_interval=None):
+        """Returns a (status, body) tuple. The body is decoded JSON if json is set, otherwise text.
+        Raises aiohttp.ClientError or asyncio.TimeoutError once all retries fail."""
+
+        host = yarl.URL(url).host
+        for attempt in range(self.retries + 1):
+            delay = self.backoff * 2**attempt
+            await self._wait_for_host(host, min_interval)
+            try:
+                async with self._get_session().get(url, params=params) as r:
+                    if r.status == 429 or r.status >= 500:
+                        if attempt == self.retries:
+                            r.raise_for_status()
+                        retry_after = r.headers.get("Retry-After")
+                        if retry_after and retry_after.isdigit():
+                            delay = max(delay, int(retry_after))
+                        logging.warning(f"GET {url} returned {r.status}, retrying in {delay}s")
+                    else:
+                        body = await (r.json(content_type=None) if json else r.text())
+                        return r.status, body
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.retries:
+                    raise
+                logging.warning(f"GET {url} failed ({type(e).__name__}), retrying in {delay}s")
+            await asyncio.sleep(delay)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+
+client = HttpClient()
@@ -1,6 +1,8 @@
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import logging.handlers
 import os
+import time
 import yaml
 
 from discord.ext import commands
@@ -9,6 +11,40 @@ from app import rankbot
 def get_cogs():
     return [f.split(".")[0] for f in os.listdir("app/cogs") if not f[0] == "_"]
 
+def timed(func, *args):
+    """Calls func and returns the elapsed time in milliseconds."""
+
+    start = time.perf_counter()
+    func(*args)
+    return 1000*(time.perf_counter() - start)
+
+def load_cogs(bot):
+    """Loads every cog and returns the load time of each in milliseconds."""
+
+    load_times = {}
+    for cog in get_cogs():
+        try:
+            load_times[cog] = timed(bot.load_extension, "app.cogs.{}".format(cog))
+            logging.info("Cog loaded: {} ({:.0f}ms)".format(cog, load_times[cog]))
+        except Exception:
+            logging.exception("Failed to load cog: {}".format(cog))
+    return load_times
+
+def warm_up(bot):
+    """Connects to MongoDB and loads the deck index in the background while the cogs load.
+    Cog imports hold the import lock, so the cogs themselves are loaded one at a time."""
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        mongo_ping = executor.submit(timed, bot.db.sync.admin.command, "ping")
+        deck_index = executor.submit(timed, bot.db.sync.load_deck_index)
+        load_times = load_cogs(bot)
+        for name, future in [("Mongo connect", mongo_ping), ("Deck index", deck_index)]:
+            try:
+                logging.info("Startup: {} {:.0f}ms".format(name, future.result()))
+            except Exception:
+                logging.exception("Startup: {} failed".format(name))
+    logging.info("Startup: loaded {} cog(s) in {:.0f}ms".format(len(load_times), sum(load_times.values())))
+
 logging_fmt = '%(asctime)-15s - %(levelname)s - %(message)s'
 handler = logging.handlers.RotatingFileHandler(filename="bot.log", maxBytes=100000, backupCount=1)
 logging.basicConfig(format=logging_fmt, handlers=[handler], level=logging.INFO)
@@ -18,11 +54,5 @@ with open("../config/bot.yml", "r") as f:
 
 bot = rankbot.RankBot(command_prefix=config["command_prefix"])
 bot.setup_config(config)
-cogs = get_cogs()
-for cog in cogs:
-    try:
-        bot.load_extension("app.cogs.{}".format(cog))
-        logging.info("Cog loaded: {}".format(cog))
-    except ImportError:
-        logging.error("Failed to load cog: {}".format(cog))
+warm_up(bot)
 bot.run(config["token"], bot=True, reconnect=True)
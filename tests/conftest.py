@@ -0,0 +1,68 @@
+"""Shared fixtures. Tests that need a database run against the MongoDB server at
+RANKBOT_TEST_MONGODB (default mongodb://localhost:27017) and are skipped when it can't
+be reached. Every test gets its own guild database, which is dropped afterwards."""
+
+import os
+import random
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+MONGODB_URI = os.environ.get("RANKBOT_TEST_MONGODB", "mongodb://localhost:27017")
+
+
+class FakeGuild(object):
+    def __init__(self, guild_id):
+        self.id = guild_id
+        self.roles = []
+
+
+def make_user(user_id, name=None):
+    return types.SimpleNamespace(id=user_id, name=name or f"player{user_id}")
+
+
+def make_ctx(guild, author=None):
+    return types.SimpleNamespace(message=types.SimpleNamespace(guild=guild, author=author))
+
+
+@pytest.fixture
+def guild():
+    return FakeGuild(random.randrange(10**17, 10**18))
+
+
+@pytest.fixture
+def rankdb(guild):
+    pymongo = pytest.importorskip("pymongo")
+    database = pytest.importorskip("app.utils.database")
+    db = database.RankDB(MONGODB_URI, serverSelectionTimeoutMS=1000)
+    try:
+        db.admin.command("ping")
+    except pymongo.errors.ServerSelectionTimeoutError:
+        db.close()
+        pytest.skip(f"no MongoDB server at {MONGODB_URI}")
+    db.setup_indices(guild)
+    yield db
+    db.drop_database(str(guild.id))
+    db.close()
+
+
+@pytest.fixture
+def players(rankdb, guild):
+    users = [make_user(user_id) for user_id in range(1, 5)]
+    for user in users:
+        rankdb.add_member(user, guild)
+    return users
+
+
+def log_accepted_match(rankdb, guild, users, decks, winner=None):
+    """Logs a match between users, with users[i] playing decks[i], and accepts it.
+    Returns the game id and the point changes."""
+
+    winner = winner or users[0]
+    game_id = rankdb.add_match(make_ctx(guild, winner), winner, users)
+    for user, deck in zip(users, decks):
+        rankdb.confirm_match_for_user(game_id, user.id, deck, guild)
+    return game_id, rankdb.check_match_status(game_id, guild)
@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+database = pytest.importorskip("app.utils.database")
+
+from conftest import log_accepted_match, make_ctx
+
+
+class SlowCalls(object):
+    """Replaces a RankDB method with one that sleeps, recording how many calls overlap."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, user_id, guild):
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        return {"user_id": user_id}
+
+
+@pytest.fixture
+def offline_db():
+    db = database.AsyncRankDB(database.RankDB("localhost", 27017, connect=False), max_workers=4)
+    yield db
+    db.close()
+
+
+def test_concurrent_calls_overlap(offline_db):
+    slow = SlowCalls(0.2)
+    offline_db.sync.find_member = slow
+
+    async def run():
+        start = time.perf_counter()
+        members = await asyncio.gather(*[offline_db.find_member(user_id, None) for user_id in range(4)])
+        return members, time.perf_counter() - start
+
+    members, elapsed = asyncio.run(run())
+    assert [member["user_id"] for member in members] == [0, 1, 2, 3]
+    assert slow.peak == 4
+    assert elapsed < 4*slow.delay
+
+
+def test_event_loop_runs_during_calls(offline_db):
+    offline_db.sync.find_member = SlowCalls(0.3)
+
+    async def run():
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        task = asyncio.ensure_future(heartbeat())
+        await offline_db.find_member(1, None)
+        task.cancel()
+        return ticks
+
+    assert asyncio.run(run()) > 10
+
+
+def test_unknown_attribute(offline_db):
+    with pytest.raises(AttributeError):
+        offline_db.not_a_method
+
+
+def test_cursors_are_materialized(rankdb, guild, players):
+    db = database.AsyncRankDB(rankdb)
+    log_accepted_match(rankdb, guild, players, ["Deck A"]*4)
+    matches = asyncio.run(db.find_user_matches(players[0].id, guild))
+    assert isinstance(matches, list)
+    assert len(matches) == 1
+
+
+def test_racing_confirmations_accept_once(rankdb, guild, players):
+    db = database.AsyncRankDB(rankdb, max_workers=4)
+    game_id = rankdb.add_match(make_ctx(guild, players[0]), players[0], players)
+    for user in players:
+        rankdb.confirm_match_for_user(game_id, user.id, "Deck A", guild)
+
+    async def run():
+        return await asyncio.gather(*[db.check_match_status(game_id, guild) for _ in range(4)])
+
+    results = asyncio.run(run())
+    assert len([result for result in results if result]) == 1
+    winner = rankdb.find_member(players[0].id, guild)
+    assert winner["wins"] == 1
+    assert winner["accepted"] == 1
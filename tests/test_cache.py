@@ -0,0 +1,25 @@
+from app.utils import cache
+
+
+def test_set_with_current_generation_is_stored():
+    values = cache.Cache()
+    generation = values.generation()
+    values.set("season", 1, generation)
+    assert values.get("season") == 1
+
+
+def test_set_after_an_invalidation_is_dropped():
+    values = cache.Cache()
+    generation = values.generation()
+    values.invalidate("season")
+    values.set("season", 1, generation)
+    assert values.get("season") is None
+
+
+def test_invalidate_where_and_clear_bump_the_generation():
+    values = cache.Cache()
+    for invalidate in [lambda: values.invalidate_where(lambda key: True), values.clear]:
+        generation = values.generation()
+        invalidate()
+        values.set("leaderboard", [], generation)
+        assert values.get("leaderboard") is None
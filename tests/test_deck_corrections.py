@@ -0,0 +1,103 @@
+import threading
+
+import pytest
+
+pytest.importorskip("app.utils.database")
+
+from conftest import log_accepted_match, make_ctx
+
+
+def deck_stats_by_name(rankdb, guild):
+    return {record["name"]: record for record in rankdb.find_deck_stats(guild)}
+
+
+def test_correcting_a_deck_moves_deck_stats(rankdb, guild, players):
+    game_id, _ = log_accepted_match(rankdb, guild, players, ["Deck A", "Deck B", "Deck C", "Deck D"])
+
+    assert rankdb.confirm_match_for_user(game_id, players[0].id, "Deck E", guild)
+
+    decks = deck_stats_by_name(rankdb, guild)
+    assert "Deck A" not in decks
+    assert decks["Deck E"]["entries"] == 1
+    assert decks["Deck E"]["wins"] == 1
+    assert decks["Deck E"]["players"] == [players[0].id]
+    assert rankdb.find_match(game_id, guild)["winning_deck"] == "Deck E"
+
+
+def test_correction_keeps_other_matches_with_the_old_deck(rankdb, guild, players):
+    first_game, _ = log_accepted_match(rankdb, guild, players, ["Deck A", "Deck B", "Deck C", "Deck D"])
+    log_accepted_match(rankdb, guild, players, ["Deck A", "Deck B", "Deck C", "Deck D"])
+
+    rankdb.confirm_match_for_user(first_game, players[0].id, "Deck E", guild)
+
+    decks = deck_stats_by_name(rankdb, guild)
+    assert decks["Deck A"]["entries"] == 1
+    assert decks["Deck A"]["players"] == [players[0].id]
+    assert decks["Deck E"]["entries"] == 1
+
+
+def test_unknown_game_or_player(rankdb, guild, players):
+    game_id, _ = log_accepted_match(rankdb, guild, players, ["Deck A"]*4)
+    assert rankdb.confirm_match_for_user("nope", players[0].id, "Deck E", guild) is None
+    assert rankdb.confirm_match_for_user(game_id, 999, "Deck E", guild) is None
+
+
+def test_correction_moves_member_deck_stats(rankdb, guild, players):
+    game_id, _ = log_accepted_match(rankdb, guild, players, ["Deck A", "Deck B", "Deck C", "Deck D"])
+
+    rankdb.confirm_match_for_user(game_id, players[0].id, "Deck E", guild)
+
+    deck_stats = rankdb.find_member(players[0].id, guild)["deck_stats"]
+    assert "Deck A" not in deck_stats
+    assert deck_stats["Deck E"]["name"] == "Deck E"
+    assert deck_stats["Deck E"]["entries"] == 1
+    assert deck_stats["Deck E"]["wins"] == 1
+
+
+def test_stats_are_rebuilt_once_for_older_leagues(rankdb, guild, players):
+    log_accepted_match(rankdb, guild, players, ["Deck A", "Deck B", "Deck C", "Deck D"])
+    rankdb.deck_stats(guild).delete_many({})
+    rankdb._set_config({"stats_version": 0}, guild)
+
+    assert rankdb.ensure_stats(guild)
+    assert deck_stats_by_name(rankdb, guild)["Deck A"]["entries"] == 1
+    assert not rankdb.ensure_stats(guild)
+
+
+def test_correction_updates_recent_decks(rankdb, guild, players):
+    first_game, _ = log_accepted_match(rankdb, guild, players, ["Deck A", "Deck B", "Deck C", "Deck D"])
+    second_game, _ = log_accepted_match(rankdb, guild, players, ["Deck A", "Deck B", "Deck C", "Deck D"])
+
+    rankdb.confirm_match_for_user(first_game, players[0].id, "Deck E", guild)
+
+    assert rankdb.find_member(players[0].id, guild)["recent_decks"] == [
+        {"game_id": first_game, "deck": "Deck E"},
+        {"game_id": second_game, "deck": "Deck A"}
+    ]
+
+
+def test_match_accepted_during_a_rebuild_is_kept(rankdb, guild, players, monkeypatch):
+    log_accepted_match(rankdb, guild, players, ["Deck A", "Deck B", "Deck C", "Deck D"])
+    game_id = rankdb.add_match(make_ctx(guild, players[0]), players[0], players)
+    for user in players:
+        rankdb.confirm_match_for_user(game_id, user.id, "Deck E", guild)
+
+    acceptance = threading.Thread(target=rankdb.check_match_status, args=(game_id, guild))
+    backfill_match_seasons = rankdb.backfill_match_seasons
+
+    def accept_during_rebuild(guild):
+        # the rebuild has started, so the acceptance has to wait for it to finish
+        acceptance.start()
+        acceptance.join(timeout=0.5)
+        assert acceptance.is_alive()
+        return backfill_match_seasons(guild)
+
+    monkeypatch.setattr(rankdb, "backfill_match_seasons", accept_during_rebuild)
+    rankdb.rebuild_stats(guild)
+    acceptance.join()
+
+    decks = deck_stats_by_name(rankdb, guild)
+    assert decks["Deck A"]["entries"] == 1
+    assert decks["Deck E"]["entries"] == 4
+    assert rankdb.find_member(players[0].id, guild)["deck_stats"]["Deck E"]["entries"] == 1
+    assert rankdb.find_head_to_head([user.id for user in players], guild)["games"] == 2
@@ -0,0 +1,39 @@
+import pytest
+
+pytest.importorskip("app.utils.database")
+
+from conftest import make_ctx
+
+
+def game_id_index(rankdb, guild):
+    return rankdb.matches(guild).index_information().get("game_id_1")
+
+
+def test_new_ids_skip_legacy_ids(rankdb, guild, players):
+    legacy_id = rankdb._game_id_hasher.encode(1)
+    rankdb.matches(guild).insert_one({"game_id": legacy_id, "players": [], "timestamp": 0})
+
+    game_id = rankdb.add_match(make_ctx(guild, players[0]), players[0], players)
+
+    assert game_id != legacy_id
+    assert rankdb.matches(guild).count_documents({"game_id": legacy_id}) == 1
+
+
+def test_duplicate_legacy_ids_keep_a_non_unique_index(rankdb, guild, players):
+    matches = rankdb.matches(guild)
+    matches.drop_index("game_id_1")
+    legacy_id = rankdb._game_id_hasher.encode(1)
+    matches.insert_many([{"game_id": legacy_id, "players": [], "timestamp": 0} for _ in range(2)])
+
+    rankdb.ensure_indexes(guild)
+
+    index = game_id_index(rankdb, guild)
+    assert index is not None
+    assert not index.get("unique", False)
+    game_id = rankdb.add_match(make_ctx(guild, players[0]), players[0], players)
+    assert game_id != legacy_id
+
+
+def test_unique_index_is_built_once_duplicates_are_gone(rankdb, guild):
+    assert game_id_index(rankdb, guild).get("unique", False)
+    assert rankdb._game_ids_unique(guild)
@@ -0,0 +1,97 @@
+"""Checks that every query shape in RankDB is served by an index. Whole-collection
+writes (score resets and the season rollover) and the single-document config
+collection are left out on purpose."""
+
+import pytest
+
+pytest.importorskip("app.utils.database")
+stc = pytest.importorskip("app.constants.status_codes")
+from pymongo import ASCENDING, DESCENDING
+
+ACCEPTED = stc.ACCEPTED
+USER = 123
+USERS = [1, 2, 3]
+
+GUILD_QUERIES = [
+    ("members", {"user_id": USER}, None),
+    ("members", {"user_id": {"$in": USERS}}, None),
+    ("members", {"pending": "abcd"}, None),
+    ("members", {"accepted": {"$gte": 10}}, [("points", DESCENDING)]),
+    ("members", {"accepted": {"$gte": 10, "$gt": 0}}, None),
+    ("matches", {"game_id": "abcd"}, None),
+    ("matches", {"game_id": {"$in": ["abcd", "efgh"]}}, [("timestamp", DESCENDING)]),
+    ("matches", {"players.user_id": USER}, [("timestamp", DESCENDING)]),
+    ("matches", {"players.deck": "Deck A"}, [("timestamp", DESCENDING)]),
+    ("matches", {"winning_deck": "Deck A"}, None),
+    ("matches", {"status": ACCEPTED}, [("timestamp", ASCENDING)]),
+    ("matches", {"status": ACCEPTED, "season_number": 1}, None),
+    ("matches", {"status": ACCEPTED, "players.user_id": {"$all": USERS}}, None),
+    ("matches", {"season_number": {"$exists": False}, "timestamp": {"$gte": 0, "$lt": 1}}, None),
+    ("matches", {
+        "status": ACCEPTED,
+        "timestamp": {"$gt": 0},
+        "players": {"$elemMatch": {"user_id": USER, "deck": "Deck A"}}
+    }, None),
+    ("seasons", {}, [("start_time", DESCENDING)]),
+    ("seasons", {"season_number": 1}, None),
+    ("standings", {"season_number": 1}, [("rank", ASCENDING)]),
+    ("standings", {"season_number": 1, "user_id": {"$in": USERS}}, [("rank", ASCENDING)]),
+    ("deck_stats", {"name": "Deck A"}, None),
+    ("head_to_head", {"_id": "1-2"}, None),
+    ("head_to_head", {"players": USER}, None),
+    ("counters", {"_id": "game_id"}, None),
+]
+
+GLOBAL_QUERIES = [
+    ("decks", {"name": "Deck A"}, None),
+    ("decks", {"canonical_aliases": "decka"}, None),
+    ("decks", {"color": "wub"}, None),
+    ("decks", {"$or": [
+        {"image_uris_updated": {"$exists": False}},
+        {"image_uris_updated": {"$lt": 0}}
+    ]}, None),
+    ("decklists", {"link": "https://tappedout.net/mtg-decks/deck-a/"}, None),
+]
+
+
+def plan_stages(plan):
+    yield plan["stage"]
+    for child in [plan.get("inputStage")] + plan.get("inputStages", []):
+        if child:
+            yield from plan_stages(child)
+
+
+def winning_plan_stages(collection, query, sort):
+    cursor = collection.find(query)
+    if sort:
+        cursor = cursor.sort(sort)
+    return list(plan_stages(cursor.explain()["queryPlanner"]["winningPlan"]))
+
+
+@pytest.mark.parametrize("collection_name,query,sort", GUILD_QUERIES)
+def test_guild_query_uses_an_index(rankdb, guild, collection_name, query, sort):
+    collection = rankdb.guild(guild)[collection_name]
+    assert "COLLSCAN" not in winning_plan_stages(collection, query, sort)
+
+
+@pytest.fixture
+def global_db(rankdb, guild):
+    """A scratch copy of the shared decks database, so the test server's own is left alone."""
+
+    db_name = f"decks_{guild.id}"
+    rankdb.ensure_global_indexes(db_name)
+    yield rankdb[db_name]
+    rankdb.drop_database(db_name)
+
+
+@pytest.mark.parametrize("collection_name,query,sort", GLOBAL_QUERIES)
+def test_global_query_uses_an_index(global_db, collection_name, query, sort):
+    collection = global_db[collection_name]
+    assert "COLLSCAN" not in winning_plan_stages(collection, query, sort)
+
+
+def test_collections_written_in_transactions_exist_after_setup(rankdb, guild):
+    # MongoDB before 4.4 can't create a collection inside a transaction
+    collections = rankdb.guild(guild).list_collection_names()
+    for name in ["members", "matches", "deck_stats", "head_to_head"]:
+        assert name in collections
@@ -0,0 +1,59 @@
+import pytest
+
+stc = pytest.importorskip("app.constants.status_codes")
+pytest.importorskip("app.utils.database")
+
+from conftest import log_accepted_match, make_ctx, make_user
+
+
+def test_acceptance_applies_scores(rankdb, guild, players):
+    _, delta = log_accepted_match(rankdb, guild, players, ["Deck A", "Deck B", "Deck C", "Deck D"])
+
+    assert sum(change["change"] for change in delta) == 0
+    winner = rankdb.find_member(players[0].id, guild)
+    assert winner["wins"] == 1
+    assert winner["pending"] == []
+    for user in players[1:]:
+        assert rankdb.find_member(user.id, guild)["losses"] == 1
+
+
+def test_match_is_accepted_once(rankdb, guild, players):
+    game_id, delta = log_accepted_match(rankdb, guild, players, ["Deck A"]*4)
+    assert delta
+    assert rankdb.check_match_status(game_id, guild) is False
+    assert rankdb.find_member(players[0].id, guild)["accepted"] == 1
+
+
+def test_unregistered_player_leaves_match_pending(rankdb, guild, players):
+    game_id = rankdb.add_match(make_ctx(guild, players[0]), players[0], players)
+    for user in players:
+        rankdb.confirm_match_for_user(game_id, user.id, "Deck A", guild)
+    rankdb.delete_member(players[3].id, guild)
+
+    assert rankdb.check_match_status(game_id, guild) is False
+    assert rankdb.find_match(game_id, guild)["status"] == stc.PENDING
+    assert rankdb.find_member(players[0].id, guild)["accepted"] == 0
+
+
+def test_head_to_head_counts_history_until_the_store_is_built(rankdb, guild, players):
+    log_accepted_match(rankdb, guild, players, ["Deck A"]*4)
+    rankdb.head_to_head(guild).delete_many({})
+    rankdb._set_config({"stats_version": 0}, guild)
+    log_accepted_match(rankdb, guild, players, ["Deck A"]*4, winner=players[1])
+
+    user_ids = [players[0].id, players[1].id]
+    record = rankdb.find_head_to_head(user_ids, guild)
+    assert record["games"] == 2
+    assert record["wins"] == {str(players[0].id): 1, str(players[1].id): 1}
+
+    rankdb.ensure_stats(guild)
+    assert rankdb.find_head_to_head(user_ids, guild)["games"] == 2
+
+
+def test_new_members_show_up_in_cached_leaderboards(rankdb, guild, players):
+    rankdb.set_player_match_threshold(0, guild)
+    assert len(rankdb.find_top_members_by("points", guild)) == len(players)
+
+    rankdb.add_member(make_user(5), guild)
+
+    assert len(rankdb.find_top_members_by("points", guild)) == len(players) + 1
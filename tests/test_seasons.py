@@ -0,0 +1,47 @@
+import pytest
+
+pytest.importorskip("app.utils.database")
+
+from conftest import log_accepted_match
+
+
+def test_rollover_records_standings_and_resets_scores(rankdb, guild, players):
+    rankdb.set_player_match_threshold(0, guild)
+    log_accepted_match(rankdb, guild, players, ["Deck A"]*4)
+
+    season_number, standings = rankdb.reset_season(guild)
+
+    assert season_number == 1
+    assert standings[0]["user_id"] == players[0].id
+    assert rankdb.find_member(players[0].id, guild)["season_gold_badges"] == 1
+    assert rankdb.get_season(guild, season=1)["season_leaders"] == [standing["user_id"] for standing in standings[:3]]
+    assert all(member["accepted"] == 0 for member in rankdb.find_members({}, guild))
+    assert rankdb.get_season(guild)["season_number"] == 2
+
+
+def test_interrupted_rollover_is_resumed_once(rankdb, guild, players):
+    rankdb.set_player_match_threshold(0, guild)
+    log_accepted_match(rankdb, guild, players, ["Deck A"]*4)
+    rankdb.seasons(guild).update_one({"season_number": 1}, {"$set": {"end_time": 1.0}})
+
+    season_number, standings = rankdb.reset_season(guild)
+    assert season_number == 1
+    assert rankdb.find_member(players[0].id, guild)["season_gold_badges"] == 1
+    assert rankdb.get_season(guild)["start_time"] == 1.0
+
+    rankdb.seasons(guild).delete_one({"season_number": 2})
+    rankdb._season_cache.clear()
+    assert rankdb.reset_season(guild) == (season_number, standings)
+    assert rankdb.find_member(players[0].id, guild)["season_gold_badges"] == 1
+
+
+def test_standings_include_members_below_the_threshold(rankdb, guild, players):
+    log_accepted_match(rankdb, guild, players, ["Deck A"]*4)
+
+    _, standings = rankdb.reset_season(guild)
+
+    assert [standing["rank"] for standing in standings] == [1, 2, 3, 4]
+    assert standings[0]["user_id"] == players[0].id
+    assert rankdb.get_season(guild, season=1)["season_leaders"] == []
+    assert rankdb.find_member(players[0].id, guild)["season_gold_badges"] == 0
+    assert len(list(rankdb.find_standings(1, guild))) == len(players)